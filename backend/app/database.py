@@ -1,17 +1,42 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import NullPool
 from app.config import get_settings
 
 settings = get_settings()
 
+if settings.DB_USE_NULLPOOL:
+    # An external pooler (e.g. PgBouncer) multiplexes connections; prepared
+    # statements do not survive transaction pooling, so asyncpg's cache is off
+    pool_options = {
+        "poolclass": NullPool,
+        "connect_args": {
+            "server_settings": {"jit": "off"},
+            "statement_cache_size": 0,
+        },
+    }
+else:
+    # Pool sized for concurrent job workflows and chunk-analysis tasks
+    pool_options = {
+        "pool_pre_ping": True,
+        "pool_size": max(settings.DB_POOL_SIZE, settings.GEMINI_MAX_CONCURRENT * 3),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "connect_args": {
+            "server_settings": {"jit": "off"},
+            "statement_cache_size": 1024,
+        },
+    }
+
 # Create async engine
 engine = create_async_engine(
     settings.DATABASE_URL,
-    echo=settings.DEBUG,
+    echo=settings.SQL_ECHO,
     future=True,
-    pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20,
+    query_cache_size=1200,
+    insertmanyvalues_page_size=1000,
+    **pool_options,
 )
 
 # Create async session factory
@@ -27,12 +52,20 @@ Base = declarative_base()
 
 
 async def get_db():
-    """Dependency for getting async database session"""
+    """
+    Dependency for getting async database session
+    
+    One transaction per request: committed when the endpoint returns,
+    rolled back if it raises. Endpoints flush instead of committing,
+    except where a write must stay visible even if the request fails.
+    """
     async with AsyncSessionLocal() as session:
         try:
             yield session
-        finally:
-            await session.close()
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
 
 
 async def init_db():
@@ -1,11 +1,15 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
+from sqlalchemy import text
+import asyncio
 import logging
 
-from app.database import init_db
+from app.database import init_db, engine
 from app.routers import jobs, analysis, patches, deduplication, monitoring, seo_spider
 from app.config import get_settings
+from app.services.task_queue import seo_analysis_queue
 
 # Configure logging
 logging.basicConfig(
@@ -17,6 +21,26 @@ logger = logging.getLogger(__name__)
 settings = get_settings()
 
 
+async def _deferred_init(app: FastAPI):
+    """
+    Warm-up work that runs after the server has started listening
+    """
+    try:
+        if settings.CREATE_TABLES:
+            await init_db()
+            logger.info("Database initialized")
+        
+        # Open a pooled connection and prime asyncpg's statement cache
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        
+        app.state.ready = True
+        logger.info("Deferred initialization complete, API is ready")
+    
+    except Exception as e:
+        logger.error(f"Deferred initialization failed: {e}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
@@ -26,12 +50,26 @@ async def lifespan(app: FastAPI):
     logger.info("Starting SEO Checker API...")
     logger.info(f"Environment: {settings.ENVIRONMENT}")
     
-    # Initialize database
-    await init_db()
-    logger.info("Database initialized")
+    # Table creation and warm-up run in the background so startup is not blocked
+    app.state.ready = False
+    init_task = asyncio.create_task(_deferred_init(app))
+    
+    await seo_analysis_queue.start(settings.SEO_ANALYSIS_WORKERS)
     
     yield
     
+    if not init_task.done():
+        init_task.cancel()
+    
+    # Analyses that will never run must not stay in a running status
+    abandoned = await seo_analysis_queue.stop()
+    try:
+        await seo_spider.fail_interrupted_analyses(
+            [kwargs["analysis_id"] for _, _, kwargs in abandoned]
+        )
+    except Exception as e:
+        logger.error(f"Failed to mark interrupted analyses as failed: {e}")
+    
     # Shutdown
     logger.info("Shutting down SEO Checker API...")
 
@@ -41,7 +79,8 @@ app = FastAPI(
     title="SEO Checker API",
     description="Production-grade SEO code analysis and auto-patching system",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -86,6 +125,25 @@ async def health():
     }
 
 
+@app.get("/health/live")
+async def health_live():
+    """
+    Liveness probe: the process is up and serving requests
+    """
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+async def health_ready():
+    """
+    Readiness probe: 503 until deferred initialization has finished
+    """
+    if not getattr(app.state, "ready", False):
+        return ORJSONResponse(status_code=503, content={"status": "starting"})
+    
+    return {"status": "ready"}
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, DateTime, JSON, Enum as SQLEnum, Text, Boolean, Float
+from sqlalchemy import Column, String, Integer, DateTime, JSON, Enum as SQLEnum, Text, Boolean, Float, Index, text
 from sqlalchemy.sql import func
 from app.database import Base
 import enum
@@ -73,6 +73,12 @@ class Chunk(Base):
     context_tail = Column(Text)  # Next 10 lines
     analyzed = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        # Partial index: only chunks still waiting for analysis
+        Index("ix_chunks_job_unanalyzed", "job_id", postgresql_where=text("analyzed = false")),
+        Index("ix_chunks_job_id_file_id", "job_id", "file_id"),
+    )
 
 
 class Issue(Base):
@@ -96,6 +102,21 @@ class Issue(Base):
     backup_path = Column(String)  # Path to backup file before patching
     applied_at = Column(DateTime(timezone=True))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        # Partial index: pending issues per job (SQLEnum stores member names)
+        Index("ix_issues_job_pending", "job_id", postgresql_where=text("status = 'PENDING'")),
+        # Deduplicator groups issues by target line
+        Index("ix_issues_file_line_job", "file_path", "line_number", "job_id"),
+        Index("ix_issues_job_id_status", "job_id", "status"),
+        # Natural key: re-analyzing a chunk must not duplicate its issues. The
+        # code is part of it (hashed: it can be long), so distinct fixes for
+        # the same line, type and action are all kept.
+        Index(
+            "uq_issue_natkey", "chunk_id", "line_number", "issue_type", "action", func.md5(code),
+            unique=True
+        ),
+    )
 
 
 class PatchHistory(Base):
@@ -112,6 +133,11 @@ class PatchHistory(Base):
     error_message = Column(Text)
     rollback_available = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        # Rollback looks up the latest history row for an issue
+        Index("ix_patch_history_issue_created", "issue_id", "created_at"),
+    )
 
 
 # Import SEO models
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, String, Integer, DateTime, JSON, Enum as SQLEnum, Text, Float, Boolean
+from sqlalchemy import Column, String, Integer, DateTime, JSON, Enum as SQLEnum, Text, Float, Boolean, ForeignKey, Index
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 from app.database import Base
 import enum
@@ -47,7 +48,7 @@ class SEOAnalysis(Base):
     status = Column(SQLEnum(SEOAnalysisStatus), default=SEOAnalysisStatus.PENDING, nullable=False)
     
     # Crawl data
-    html_content = Column(Text)
+    html_content = deferred(Column(Text))  # Large; only loaded when accessed explicitly
     screenshot_path = Column(String)
     page_title = Column(String)
     meta_description = Column(String)
@@ -79,6 +80,15 @@ class SEOAnalysis(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     completed_at = Column(DateTime(timezone=True))
+    
+    # Child rows, loaded together with the analysis via selectinload
+    issues = relationship("SEOIssue", cascade="all, delete-orphan", passive_deletes=True)
+    metric = relationship("SEOMetric", uselist=False, cascade="all, delete-orphan", passive_deletes=True)
+    
+    __table_args__ = (
+        # list_analyses: ORDER BY created_at DESC LIMIT n
+        Index("ix_seo_analyses_created_at_desc", created_at.desc()),
+    )
 
 
 class SEOIssue(Base):
@@ -86,7 +96,7 @@ class SEOIssue(Base):
     __tablename__ = "seo_issues"
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    analysis_id = Column(String, nullable=False, index=True)
+    analysis_id = Column(String, ForeignKey("seo_analyses.id", ondelete="CASCADE"), nullable=False, index=True)
     
     issue_type = Column(SQLEnum(SEOIssueType), nullable=False)
     severity = Column(SQLEnum(SEOIssueSeverity), nullable=False)
@@ -110,7 +120,7 @@ class SEOMetric(Base):
     __tablename__ = "seo_metrics"
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    analysis_id = Column(String, nullable=False, index=True)
+    analysis_id = Column(String, ForeignKey("seo_analyses.id", ondelete="CASCADE"), nullable=False, index=True)
     
     # Schema analysis
     schemas_found = Column(JSON, default=list)  # List of schema types found
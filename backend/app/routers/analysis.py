@@ -1,131 +1,266 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
+from sqlalchemy import select, update, case, literal, bindparam, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from dataclasses import dataclass
+from typing import List, Optional
+import asyncio
 import logging
 
-from app.database import get_db
+from app.database import get_db, AsyncSessionLocal
 from app.models import Job, Chunk, Issue, JobStatus, IssueStatus
 from app.services.gemini_client import gemini_client
 from app.services.deduplicator import deduplicator
-from app.services.rate_limiter import rate_limiter
-from app.schemas import GeminiPromptData, GlobalRules
+from app.schemas import GeminiPromptData, GeminiResponse, GlobalRules
 from app.config import get_settings
 
 router = APIRouter(prefix="/analysis", tags=["analysis"])
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Prompt rules are the same for every chunk
+_GLOBAL_RULES = GlobalRules()
+
+# Hot-path statements, built once so their compiled form is reused
+_INSERT_ISSUES = pg_insert(Issue).on_conflict_do_nothing(
+    # Issues already stored for a chunk (retries) are skipped; matches uq_issue_natkey
+    index_elements=[Issue.chunk_id, Issue.line_number, Issue.issue_type, Issue.action, func.md5(Issue.code)]
+)
+
+_MARK_CHUNK_ANALYZED = (
+    update(Chunk)
+    .where(Chunk.id == bindparam("cid"))
+    .values(analyzed=True)
+    .execution_options(synchronize_session=False)
+)
+
+# Atomic increment that flips status to COMPLETED in the same statement
+# once the last chunk is counted
+_INC_JOB = (
+    update(Job)
+    .where(Job.id == bindparam("jid"))
+    .values(
+        analyzed_chunks=Job.analyzed_chunks + 1,
+        status=case(
+            (
+                Job.analyzed_chunks + 1 >= Job.total_chunks,
+                literal(JobStatus.COMPLETED, Job.status.type)
+            ),
+            else_=Job.status
+        )
+    )
+    .returning(Job.analyzed_chunks, Job.total_chunks, Job.status)
+    .execution_options(synchronize_session=False)
+)
+
+# Log job progress every N analyzed chunks
+_PROGRESS_LOG_EVERY = 25
+
+# Running analysis supervisors (asyncio only keeps weak references to tasks)
+_analysis_runs = set()
+
+
+@dataclass(frozen=True)
+class ChunkPayload:
+    """Chunk fields needed for analysis, loaded up front by the caller"""
+    id: int
+    file_path: str
+    start_line: int
+    end_line: int
+    content: str
+    context_head: Optional[str]
+    context_tail: Optional[str]
+
+
+def _job_prompt_settings(job: Job) -> tuple:
+    """Extract (keywords, site_language, site_url) from job metadata"""
+    metadata = job.job_metadata or {}
+    return (
+        tuple(metadata.get('keywords') or ()),
+        metadata.get('site_language', 'tr'),
+        metadata.get('site_url', '')
+    )
+
+
+def _chunk_payload_query(job_id: str):
+    """Column-level select of unanalyzed chunks for a job"""
+    return select(
+        Chunk.id,
+        Chunk.file_path,
+        Chunk.start_line,
+        Chunk.end_line,
+        Chunk.content,
+        Chunk.context_head,
+        Chunk.context_tail
+    ).where(
+        Chunk.job_id == job_id,
+        Chunk.analyzed == False
+    )
+
+
+def _prompt_data(
+    chunk: ChunkPayload,
+    keywords: tuple,
+    site_language: str,
+    site_url: str
+) -> GeminiPromptData:
+    """Build the Gemini prompt data for a chunk"""
+    return GeminiPromptData(
+        file=chunk.file_path,
+        chunk_start=chunk.start_line,
+        chunk_end=chunk.end_line,
+        content=chunk.content,
+        context_head=chunk.context_head,
+        context_tail=chunk.context_tail,
+        keywords=keywords,
+        site_language=site_language,
+        site_url=site_url,
+        global_rules=_GLOBAL_RULES
+    )
+
+
+async def _save_chunk_result(chunk_id: int, job_id: str, response: GeminiResponse):
+    """Store a chunk's issues, mark it analyzed and count it on the job"""
+    async with AsyncSessionLocal() as db:
+        # Save issues to database (will deduplicate later) in a single bulk INSERT
+        rows = [
+            {
+                "job_id": job_id,
+                "chunk_id": chunk_id,
+                "file_path": response.file,
+                "line_number": issue_data.line,
+                "issue_type": issue_data.type,
+                "action": issue_data.action.value,
+                "code": issue_data.code,
+                "reason": issue_data.reason,
+                "severity": issue_data.severity,
+                "confidence": issue_data.confidence,
+                "review_required": issue_data.review_required,
+                "suggested_rewrite": issue_data.suggested_rewrite,
+                "status": IssueStatus.PENDING,
+            }
+            for issue_data in response.issues
+        ]
+        if rows:
+            await db.execute(_INSERT_ISSUES, rows)
+        
+        # Mark chunk as analyzed
+        await db.execute(_MARK_CHUNK_ANALYZED, {"cid": chunk_id})
+        
+        # Update job progress
+        result = await db.execute(_INC_JOB, {"jid": job_id})
+        row = result.first()
+        
+        # Single commit for issues, chunk flag and job progress
+        await db.commit()
+        
+        if row is None:
+            logger.warning(f"Job {job_id} not found while updating progress for chunk {chunk_id}")
+        else:
+            analyzed, total, status = row
+            
+            if status == JobStatus.COMPLETED and analyzed >= total:
+                logger.info(f"Job {job_id} completed! All {analyzed} chunks analyzed.")
+            elif analyzed % _PROGRESS_LOG_EVERY == 0:
+                # The counter comes from the atomic UPDATE, so no local lock is needed
+                logger.info(f"Job {job_id} progress: {analyzed}/{total} chunks analyzed")
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Completed analysis of chunk {chunk_id}: {len(response.issues)} issues found")
+
 
 async def analyze_chunk_task(
-    chunk_id: int,
+    chunk: ChunkPayload,
     job_id: str,
-    keywords: list,
+    keywords: tuple,
     site_language: str,
-    site_url: str,
-    db: AsyncSession
+    site_url: str
 ):
     """
     Background task to analyze a single chunk
+    
+    The chunk is passed in by the caller; a session is only opened for
+    the writes (the request-scoped one is closed once the response has
+    been sent).
     """
+    chunk_id = chunk.id
     try:
-        # Get chunk
-        result = await db.execute(select(Chunk).where(Chunk.id == chunk_id))
-        chunk = result.scalar_one_or_none()
-        
-        if not chunk:
-            logger.error(f"Chunk {chunk_id} not found")
-            return
-        
-        # Build prompt data
-        prompt_data = GeminiPromptData(
-            file=chunk.file_path,
-            chunk_start=chunk.start_line,
-            chunk_end=chunk.end_line,
-            content=chunk.content,
-            context_head=chunk.context_head,
-            context_tail=chunk.context_tail,
-            keywords=keywords,
-            site_language=site_language,
-            site_url=site_url,
-            global_rules=GlobalRules()
-        )
+        prompt_data = _prompt_data(chunk, keywords, site_language, site_url)
         
-        # Analyze with Gemini (with rate limiting)
-        logger.info(f"Analyzing chunk {chunk_id} for job {job_id}")
-        
-        # Use rate limiter to control concurrent requests
-        async with rate_limiter:
-            response = await gemini_client.analyze_chunk(prompt_data)
-        
-        # Save issues to database (will deduplicate later)
-        for issue_data in response.issues:
-            issue = Issue(
-                job_id=job_id,
-                chunk_id=chunk_id,
-                file_path=response.file,
-                line_number=issue_data.line,
-                issue_type=issue_data.type,
-                action=issue_data.action.value,
-                code=issue_data.code,
-                reason=issue_data.reason,
-                severity=issue_data.severity,
-                confidence=issue_data.confidence,
-                review_required=issue_data.review_required,
-                suggested_rewrite=issue_data.suggested_rewrite,
-                status=IssueStatus.PENDING
-            )
-            db.add(issue)
+        # Analyze with Gemini (rate limiting is enforced inside the client)
+        logger.debug(f"Analyzing chunk {chunk_id} for job {job_id}")
+        response = await gemini_client.analyze_chunk(prompt_data)
         
-        # Mark chunk as analyzed
-        await db.execute(
-            update(Chunk)
-            .where(Chunk.id == chunk_id)
-            .values(analyzed=True)
-        )
-        
-        await db.commit()
+        await _save_chunk_result(chunk_id, job_id, response)
         
-        # Update job progress
-        result = await db.execute(
-            select(Job).where(Job.id == job_id)
-        )
-        job = result.scalar_one_or_none()
-        
-        if job:
-            # Atomic increment of analyzed_chunks
-            result = await db.execute(
-                update(Job)
-                .where(Job.id == job_id)
-                .values(analyzed_chunks=Job.analyzed_chunks + 1)
-                .returning(Job.analyzed_chunks, Job.total_chunks)
-            )
-            await db.commit()
-            
-            row = result.first()
-            if row:
-                analyzed, total = row
-                logger.info(f"Job {job_id} progress: {analyzed}/{total} chunks analyzed")
-                
-                # Check if all chunks are completed
-                if analyzed >= total:
-                    await db.execute(
-                        update(Job)
-                        .where(Job.id == job_id)
-                        .values(status=JobStatus.COMPLETED)
-                    )
-                    await db.commit()
-                    logger.info(f"Job {job_id} completed! All {analyzed} chunks analyzed.")
-        
-        logger.info(f"Completed analysis of chunk {chunk_id}: {len(response.issues)} issues found")
-    
     except Exception as e:
         logger.error(f"Failed to analyze chunk {chunk_id}: {e}")
 
 
+async def analyze_chunk_batch_task(
+    chunks: List[ChunkPayload],
+    job_id: str,
+    keywords: tuple,
+    site_language: str,
+    site_url: str
+):
+    """
+    Analyze several chunks with a single Gemini request
+    
+    If the batch request fails, the chunks are retried one by one so a
+    single bad answer does not lose the whole batch.
+    """
+    if len(chunks) == 1:
+        await analyze_chunk_task(chunks[0], job_id, keywords, site_language, site_url)
+        return
+    
+    try:
+        prompts = [_prompt_data(chunk, keywords, site_language, site_url) for chunk in chunks]
+        responses = await gemini_client.analyze_chunks_batch(prompts, batch_size=len(prompts))
+    except Exception as e:
+        logger.warning(f"Batch analysis of {len(chunks)} chunks failed for job {job_id}, analyzing one by one: {e}")
+        for chunk in chunks:
+            await analyze_chunk_task(chunk, job_id, keywords, site_language, site_url)
+        return
+    
+    for chunk, response in zip(chunks, responses):
+        try:
+            await _save_chunk_result(chunk.id, job_id, response)
+        except Exception as e:
+            logger.error(f"Failed to analyze chunk {chunk.id}: {e}")
+
+
+async def _run_all(
+    chunks: list,
+    job_id: str,
+    keywords: tuple,
+    site_language: str,
+    site_url: str
+):
+    """
+    Analyze all chunks of a job concurrently
+    
+    Chunks go to Gemini GEMINI_BATCH_SIZE at a time. The semaphore
+    bounds how many batches hold a DB session at once; Gemini
+    concurrency itself is enforced by the rate limiter.
+    """
+    semaphore = asyncio.Semaphore(settings.GEMINI_MAX_CONCURRENT * 2)
+    batch_size = max(1, settings.GEMINI_BATCH_SIZE)
+    
+    async def run_batch(batch: List[ChunkPayload]):
+        async with semaphore:
+            await analyze_chunk_batch_task(batch, job_id, keywords, site_language, site_url)
+    
+    await asyncio.gather(
+        *(run_batch(chunks[i:i + batch_size]) for i in range(0, len(chunks), batch_size)),
+        return_exceptions=True
+    )
+    logger.info(f"Finished analysis run for job {job_id}: {len(chunks)} chunks processed")
+
+
 @router.post("/{job_id}/analyze")
 async def start_analysis(
     job_id: str,
-    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -141,35 +276,27 @@ async def start_analysis(
         if not job:
             raise HTTPException(status_code=404, detail="Job not found")
         
-        # Get metadata
-        keywords = job.job_metadata.get('keywords', []) if job.job_metadata else []
-        site_language = job.job_metadata.get('site_language', 'tr') if job.job_metadata else 'tr'
-        site_url = job.job_metadata.get('site_url', '') if job.job_metadata else ''
+        # Get metadata once; passed to every chunk task as primitives
+        keywords, site_language, site_url = _job_prompt_settings(job)
         
-        # Get all chunks
-        result = await db.execute(
-            select(Chunk).where(
-                Chunk.job_id == job_id,
-                Chunk.analyzed == False
-            )
-        )
-        chunks = result.scalars().all()
+        # Get all chunks (plain rows, no ORM objects)
+        result = await db.execute(_chunk_payload_query(job_id))
+        chunks = [ChunkPayload(*row) for row in result]
         
         if not chunks:
             raise HTTPException(status_code=400, detail="No chunks to analyze")
         
-        # Queue ALL chunks for automatic analysis
-        # Process in batches of 5 for rate limiting
-        for i, chunk in enumerate(chunks):
-            background_tasks.add_task(
-                analyze_chunk_task,
-                chunk.id,
-                job_id,
-                keywords,
-                site_language,
-                site_url,
-                db
-            )
+        # Analyze ALL chunks concurrently in a supervisor task
+        task = asyncio.create_task(_run_all(
+            chunks,
+            job_id,
+            keywords,
+            site_language,
+            site_url
+        ))
+        # Keep a strong reference until the task finishes
+        _analysis_runs.add(task)
+        task.add_done_callback(_analysis_runs.discard)
         
         logger.info(f"Started FULL AUTOMATIC analysis for job {job_id}: {len(chunks)} chunks")
         
@@ -202,17 +329,11 @@ async def analyze_batch(
         if not job:
             raise HTTPException(status_code=404, detail="Job not found")
         
-        keywords = job.metadata.get('keywords', [])
-        site_language = job.metadata.get('site_language', 'tr')
-        site_url = job.metadata.get('site_url', '')
+        keywords, site_language, site_url = _job_prompt_settings(job)
         
         # Get unanalyzed chunks
-        result = await db.execute(
-            select(Chunk)
-            .where(Chunk.job_id == job_id, Chunk.analyzed == False)
-            .limit(batch_size)
-        )
-        chunks = result.scalars().all()
+        result = await db.execute(_chunk_payload_query(job_id).limit(batch_size))
+        chunks = [ChunkPayload(*row) for row in result]
         
         if not chunks:
             return {
@@ -225,12 +346,11 @@ async def analyze_batch(
         total_issues = 0
         for chunk in chunks:
             await analyze_chunk_task(
-                chunk.id,
+                chunk,
                 job_id,
                 keywords,
                 site_language,
-                site_url,
-                db
+                site_url
             )
             total_issues += 1
         
@@ -1,10 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
+from sqlalchemy import select, update, func, case, distinct
 import logging
 
 from app.database import get_db
-from app.models import Issue, IssueStatus
+from app.models import Issue, IssueStatus, IssueSeverity
 from app.services.deduplicator import deduplicator
 
 router = APIRouter(prefix="/deduplication", tags=["deduplication"])
@@ -24,66 +24,83 @@ async def deduplicate_job_issues(
     - Same line, conflicting patches → Mark as conflict
     """
     try:
-        # Get all pending issues for job
-        result = await db.execute(
-            select(Issue).where(
-                Issue.job_id == job_id,
-                Issue.status == IssueStatus.PENDING
-            )
+        pending = (
+            Issue.job_id == job_id,
+            Issue.status == IssueStatus.PENDING
         )
-        issues = result.scalars().all()
         
-        if not issues:
+        result = await db.execute(select(func.count()).select_from(Issue).where(*pending))
+        total_issues = result.scalar_one()
+        
+        if not total_issues:
             return {
                 "job_id": job_id,
                 "message": "No issues to deduplicate"
             }
         
-        # Convert to dict for deduplicator
-        issues_dict = [
-            {
-                'id': issue.id,
-                'file_path': issue.file_path,
-                'line_number': issue.line_number,
-                'action': issue.action,
-                'code': issue.code,
-                'severity': issue.severity,
-                'status': issue.status
-            }
-            for issue in issues
+        # Conflicts: lines with more than one distinct replace_line patch.
+        # Every issue on such a line is marked, pointing at its peers.
+        conflict_groups = (
+            select(
+                Issue.file_path,
+                Issue.line_number,
+                func.array_agg(Issue.id).label("ids")
+            )
+            .where(*pending)
+            .group_by(Issue.file_path, Issue.line_number)
+            .having(
+                func.count(distinct(case((Issue.action == 'replace_line', Issue.code)))) > 1
+            )
+            .subquery()
+        )
+        result = await db.execute(
+            update(Issue)
+            .where(
+                *pending,
+                Issue.file_path == conflict_groups.c.file_path,
+                Issue.line_number == conflict_groups.c.line_number
+            )
+            .values(
+                status=IssueStatus.CONFLICT,
+                conflict_with=func.to_json(func.array_remove(conflict_groups.c.ids, Issue.id))
+            )
+            .returning(Issue.id, Issue.file_path, Issue.line_number, Issue.action, Issue.severity)
+            .execution_options(synchronize_session=False)
+        )
+        conflicts = [
+            {**row, 'status': 'conflict'}
+            for row in result.mappings()
         ]
         
-        # Deduplicate
-        deduplicated = deduplicator.deduplicate_issues(issues_dict)
-        
-        # Update database
-        superseded_count = 0
-        conflict_count = 0
-        
-        for issue_data in deduplicated:
-            if issue_data['status'] == 'superseded':
-                await db.execute(
-                    update(Issue)
-                    .where(Issue.id == issue_data['id'])
-                    .values(status=IssueStatus.SUPERSEDED)
-                )
-                superseded_count += 1
-            
-            elif issue_data['status'] == 'conflict':
-                await db.execute(
-                    update(Issue)
-                    .where(Issue.id == issue_data['id'])
-                    .values(
-                        status=IssueStatus.CONFLICT,
-                        conflict_with=issue_data.get('conflict_with', [])
-                    )
-                )
-                conflict_count += 1
-        
-        await db.commit()
+        # Remaining duplicates: keep the highest severity issue per line
+        severity_rank = case(
+            {severity: deduplicator.SEVERITY_ORDER[severity.value] for severity in IssueSeverity},
+            value=Issue.severity,
+            else_=0
+        )
+        ranked = (
+            select(
+                Issue.id,
+                func.row_number().over(
+                    partition_by=(Issue.file_path, Issue.line_number),
+                    order_by=(severity_rank.desc(), Issue.confidence.desc(), Issue.id)
+                ).label("rn")
+            )
+            .where(*pending)
+            .subquery()
+        )
+        result = await db.execute(
+            update(Issue)
+            .where(Issue.id == ranked.c.id, ranked.c.rn > 1)
+            .values(status=IssueStatus.SUPERSEDED)
+            .returning(Issue.id)
+            .execution_options(synchronize_session=False)
+        )
+        superseded_count = len(result.all())
+        conflict_count = len(conflicts)
         
         # Get conflict summary
-        conflict_summary = deduplicator.get_conflict_summary(deduplicated)
+        conflict_summary = deduplicator.get_conflict_summary(conflicts)
         
         logger.info(
             f"Deduplication complete for job {job_id}: "
@@ -92,7 +109,7 @@ async def deduplicate_job_issues(
         
         return {
             "job_id": job_id,
-            "total_issues": len(issues),
+            "total_issues": total_issues,
             "superseded": superseded_count,
             "conflicts": conflict_count,
             "conflict_summary": conflict_summary
@@ -112,13 +129,23 @@ async def get_conflicts(
     Get all conflicts for a job
     """
     try:
+        # Only the columns serialized below (skips reason, suggested_rewrite, ...)
         result = await db.execute(
-            select(Issue).where(
+            select(
+                Issue.id,
+                Issue.file_path,
+                Issue.line_number,
+                Issue.action,
+                Issue.code,
+                Issue.severity,
+                Issue.confidence,
+                Issue.conflict_with
+            ).where(
                 Issue.job_id == job_id,
                 Issue.status == IssueStatus.CONFLICT
             )
         )
-        conflicts = result.scalars().all()
+        conflicts = result.all()
         
         return {
             "job_id": job_id,
@@ -1,15 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
+from sqlalchemy import select, update, insert, delete
 from typing import List
+import asyncio
 import uuid
 import logging
 
-from app.database import get_db
+from app.database import get_db, AsyncSessionLocal
 from app.models import Job, File as FileModel, Chunk, Issue, JobStatus
 from app.schemas import JobCreate, JobResponse, FileResponse, IssueResponse
-from app.services.file_handler import FileHandler
-from app.services.chunker import chunker
+from app.services.file_handler import FileHandler, UploadTooLargeError, ExtractionTooLargeError
+from app.services.chunker import chunker, ChunkRecord
 from app.services.gemini_client import gemini_client
 from app.services.memory_guard import memory_guard
 from app.schemas import GeminiPromptData, GlobalRules
@@ -21,6 +22,20 @@ settings = get_settings()
 
 file_handler = FileHandler(settings.UPLOAD_DIR)
 
+# Rows per bulk INSERT when saving chunks
+CHUNK_INSERT_PAGE_SIZE = 1000
+
+# Files read and chunked concurrently in chunk_files
+CHUNK_READ_CONCURRENCY = 32
+
+
+def _read_and_chunk(file_path: str) -> List[ChunkRecord]:
+    """Read a source file and split it into chunks (runs in a worker thread)"""
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        content = f.read()
+    
+    return chunker.chunk_file(file_path, content)
+
 
 @router.get("", response_model=List[JobResponse])
 async def get_all_jobs(
@@ -50,16 +65,12 @@ async def create_job(
         # Generate job ID
         job_id = str(uuid.uuid4())
         
-        # Validate file size
-        file_content = await file.read()
-        if len(file_content) > settings.MAX_UPLOAD_SIZE:
-            raise HTTPException(status_code=413, detail="File too large")
-        
-        # Save uploaded file
-        upload_path = await file_handler.save_upload(
-            file_content,
+        # Stream uploaded file to disk (size is checked while streaming)
+        upload_path = await file_handler.save_upload_stream(
+            file,
             file.filename,
-            job_id
+            job_id,
+            settings.MAX_UPLOAD_SIZE
         )
         
         # Create job record
@@ -68,7 +79,7 @@ async def create_job(
             status=JobStatus.UPLOADING,
             upload_filename=file.filename,
             workspace_path=upload_path,
-            metadata={
+            job_metadata={
                 'keywords': keywords.split(','),
                 'site_language': site_language,
                 'site_url': site_url
@@ -76,55 +87,103 @@ async def create_job(
         )
         
         db.add(job)
-        await db.commit()
+        await db.flush()
         await db.refresh(job)
         
         logger.info(f"Created job: {job_id}")
         return job
     
+    except UploadTooLargeError as e:
+        logger.error(f"Rejected upload for job {job_id}: {e}")
+        raise HTTPException(status_code=413, detail="File too large")
+    
     except Exception as e:
         logger.error(f"Failed to create job: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/{job_id}/extract")
-async def extract_and_inventory(
-    job_id: str,
-    db: AsyncSession = Depends(get_db)
-):
+async def extract_and_inventory(job_id: str):
     """
     Extract uploaded archive and create file inventory
+    
+    Sessions are opened only around the DB work, so no pooled connection
+    is held during extraction and the filesystem walk.
     """
     try:
-        # Get job
-        result = await db.execute(select(Job).where(Job.id == job_id))
-        job = result.scalar_one_or_none()
-        
-        if not job:
-            raise HTTPException(status_code=404, detail="Job not found")
+        async with AsyncSessionLocal() as db:
+            # Get job
+            result = await db.execute(select(Job.workspace_path).where(Job.id == job_id))
+            workspace_path = result.scalar_one_or_none()
+            
+            if workspace_path is None:
+                raise HTTPException(status_code=404, detail="Job not found")
+            
+            # Update status
+            await db.execute(
+                update(Job)
+                .where(Job.id == job_id)
+                .values(status=JobStatus.CHUNKING)
+            )
+            await db.commit()
         
-        # Update status
-        await db.execute(
-            update(Job)
-            .where(Job.id == job_id)
-            .values(status=JobStatus.CHUNKING)
+        # MEMORY GUARD: Check declared uncompressed size before extracting
+        declared_size = await asyncio.to_thread(
+            file_handler.peek_uncompressed_size,
+            workspace_path
         )
-        await db.commit()
         
-        # Extract archive
-        extract_dir = file_handler.extract_archive(job.workspace_path, job_id)
+        if declared_size > memory_guard.MAX_EXTRACTED_SIZE_BYTES:
+            error_msg = (
+                f"Archive expands to {memory_guard.format_size(declared_size)}, "
+                f"limit is {memory_guard.format_size(memory_guard.MAX_EXTRACTED_SIZE_BYTES)}"
+            )
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(Job)
+                    .where(Job.id == job_id)
+                    .values(status=JobStatus.FAILED, job_metadata={'error': error_msg})
+                )
+                await db.commit()
+            
+            logger.error(f"Job {job_id} aborted before extraction: {error_msg}")
+            raise HTTPException(status_code=413, detail=error_msg)
         
-        # MEMORY GUARD: Check extracted size
-        is_valid, total_size, error_msg = memory_guard.check_directory_size(extract_dir)
+        # Extract archive (in a worker thread, extraction is blocking)
+        try:
+            extract_dir = await asyncio.to_thread(
+                file_handler.extract_archive,
+                workspace_path,
+                job_id,
+                memory_guard.MAX_EXTRACTED_SIZE_BYTES
+            )
+        except ExtractionTooLargeError as e:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(Job)
+                    .where(Job.id == job_id)
+                    .values(status=JobStatus.FAILED, job_metadata={'error': str(e)})
+                )
+                await db.commit()
+            
+            logger.error(f"Job {job_id} aborted during extraction: {e}")
+            raise HTTPException(status_code=413, detail=str(e))
+        
+        # MEMORY GUARD: Check extracted size (directory walk, in a worker thread)
+        is_valid, total_size, error_msg = await asyncio.to_thread(
+            memory_guard.check_directory_size,
+            extract_dir
+        )
         
         if not is_valid:
             # Update job status to failed
-            await db.execute(
-                update(Job)
-                .where(Job.id == job_id)
-                .values(status=JobStatus.FAILED, metadata={'error': error_msg})
-            )
-            await db.commit()
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(Job)
+                    .where(Job.id == job_id)
+                    .values(status=JobStatus.FAILED, job_metadata={'error': error_msg})
+                )
+                await db.commit()
             
             logger.error(f"Job {job_id} aborted: {error_msg}")
             raise HTTPException(status_code=413, detail=error_msg)
@@ -134,29 +193,32 @@ async def extract_and_inventory(
             f"{memory_guard.format_size(total_size)}"
         )
         
-        # Create inventory
-        inventory = file_handler.create_inventory(extract_dir)
-        
-        # Save files to database
-        for file_info in inventory:
-            file_record = FileModel(
-                job_id=job_id,
-                file_path=file_info['absolute_path'],  # Use absolute path for reading
-                file_type=file_info['file_type'],
-                line_count=file_info['line_count'],
-                size_bytes=file_info['size_bytes']
-            )
-            db.add(file_record)
+        # Create inventory (directory walk + line counts, in a worker thread)
+        inventory = await asyncio.to_thread(file_handler.create_inventory, extract_dir)
         
-        await db.commit()
+        rows = [
+            {
+                "job_id": job_id,
+                "file_path": file_info['absolute_path'],  # Use absolute path for reading
+                "file_type": file_info['file_type'],
+                "line_count": file_info['line_count'],
+                "size_bytes": file_info['size_bytes'],
+            }
+            for file_info in inventory
+        ]
         
-        # Update job
-        await db.execute(
-            update(Job)
-            .where(Job.id == job_id)
-            .values(total_files=len(inventory))
-        )
-        await db.commit()
+        async with AsyncSessionLocal() as db:
+            # Save files to database (bulk executemany INSERT)
+            if rows:
+                await db.execute(insert(FileModel), rows)
+            
+            # Update job
+            await db.execute(
+                update(Job)
+                .where(Job.id == job_id)
+                .values(total_files=len(inventory))
+            )
+            await db.commit()
         
         logger.info(f"Extracted and inventoried {len(inventory)} files for job {job_id}")
         
@@ -166,64 +228,97 @@ async def extract_and_inventory(
             "extract_dir": extract_dir
         }
     
+    except HTTPException:
+        raise
+    
     except Exception as e:
         logger.error(f"Failed to extract: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _insert_chunk_page(rows: List[dict]) -> List[int]:
+    """Insert one page of chunk rows in its own short transaction"""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(insert(Chunk).returning(Chunk.id), rows)
+        chunk_ids = list(result.scalars())
+        await db.commit()
+    return chunk_ids
+
+
+async def _delete_chunks(chunk_ids: List[int]):
+    """Remove chunks written by a chunk run that failed part way"""
+    async with AsyncSessionLocal() as db:
+        for i in range(0, len(chunk_ids), CHUNK_INSERT_PAGE_SIZE):
+            await db.execute(
+                delete(Chunk).where(Chunk.id.in_(chunk_ids[i:i + CHUNK_INSERT_PAGE_SIZE]))
+            )
+        await db.commit()
+
+
 @router.post("/{job_id}/chunk")
-async def chunk_files(
-    job_id: str,
-    db: AsyncSession = Depends(get_db)
-):
+async def chunk_files(job_id: str):
     """
     Chunk all files in job
+    
+    Files are read and chunked with no session held. Chunk rows are
+    written a page at a time as they build up, each page in its own short
+    transaction, so memory stays bounded; pages already written are
+    removed again if the run fails.
     """
+    inserted_ids = []
     try:
-        # Get all files for job
-        result = await db.execute(
-            select(FileModel).where(FileModel.job_id == job_id)
-        )
-        files = result.scalars().all()
+        async with AsyncSessionLocal() as db:
+            # Get all files for job
+            result = await db.execute(
+                select(FileModel.id, FileModel.file_path).where(FileModel.job_id == job_id)
+            )
+            files = result.all()
         
         if not files:
             raise HTTPException(status_code=404, detail="No files found for job")
         
         total_chunks = 0
+        chunk_rows = []
         
-        # Chunk each file
-        for file_record in files:
-            # Read file content
-            with open(file_record.file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-            
-            # Create chunks
-            chunks = chunker.chunk_file(file_record.file_path, content)
+        # Read and chunk files in worker threads, a window of files at a time
+        for i in range(0, len(files), CHUNK_READ_CONCURRENCY):
+            window = files[i:i + CHUNK_READ_CONCURRENCY]
+            results = await asyncio.gather(*(
+                asyncio.to_thread(_read_and_chunk, file_record.file_path)
+                for file_record in window
+            ))
             
-            # Save chunks to database
-            for chunk_data in chunks:
-                chunk = Chunk(
-                    job_id=job_id,
-                    file_id=file_record.id,
-                    file_path=file_record.file_path,
-                    start_line=chunk_data['start_line'],
-                    end_line=chunk_data['end_line'],
-                    content=chunk_data['content'],
-                    context_head=chunk_data['context_head'],
-                    context_tail=chunk_data['context_tail']
-                )
-                db.add(chunk)
-                total_chunks += 1
+            for file_record, chunks in zip(window, results):
+                for chunk_data in chunks:
+                    chunk_rows.append({
+                        "job_id": job_id,
+                        "file_id": file_record.id,
+                        "file_path": file_record.file_path,
+                        "start_line": chunk_data.start_line,
+                        "end_line": chunk_data.end_line,
+                        "content": chunk_data.content,
+                        "context_head": chunk_data.context_head,
+                        "context_tail": chunk_data.context_tail,
+                    })
+                total_chunks += len(chunks)
+                
+                # Save chunks to database in pages to cap memory
+                if len(chunk_rows) >= CHUNK_INSERT_PAGE_SIZE:
+                    inserted_ids += await _insert_chunk_page(chunk_rows)
+                    chunk_rows = []
         
-        await db.commit()
+        if chunk_rows:
+            inserted_ids += await _insert_chunk_page(chunk_rows)
+            chunk_rows = []
         
-        # Update job
-        await db.execute(
-            update(Job)
-            .where(Job.id == job_id)
-            .values(total_chunks=total_chunks, status=JobStatus.ANALYZING)
-        )
-        await db.commit()
+        async with AsyncSessionLocal() as db:
+            # Update job
+            await db.execute(
+                update(Job)
+                .where(Job.id == job_id)
+                .values(total_chunks=total_chunks, status=JobStatus.ANALYZING)
+            )
+            await db.commit()
         
         logger.info(f"Created {total_chunks} chunks for job {job_id}")
         
@@ -234,6 +329,13 @@ async def chunk_files(
     
     except Exception as e:
         logger.error(f"Failed to chunk files: {e}")
+        
+        if inserted_ids:
+            try:
+                await _delete_chunks(inserted_ids)
+            except Exception as cleanup_error:
+                logger.error(f"Failed to remove partial chunks for job {job_id}: {cleanup_error}")
+        
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -4,6 +4,8 @@ import logging
 from app.services.rate_limiter import rate_limiter
 from app.services.circuit_breaker import circuit_breaker
 from app.services.memory_guard import memory_guard
+from app.services.task_queue import seo_analysis_queue
+from app.services.gemini_client import gemini_client
 
 router = APIRouter(prefix="/monitoring", tags=["monitoring"])
 logger = logging.getLogger(__name__)
@@ -15,17 +17,15 @@ async def health_check():
     Health check endpoint with full monitoring data
     """
     # Get all circuit breaker statuses
-    circuit_breakers_list = []
-    # Iterate through all tracked job_ids in failures dict
-    for job_id in circuit_breaker.failures.keys():
-        status = circuit_breaker.get_status(job_id)
-        circuit_breakers_list.append(status)
+    circuit_breakers_list = circuit_breaker.get_all_statuses()
     
     return {
         "status": "healthy",
         "service": "AI Anabasis SEO Spider",
         "rate_limiter": rate_limiter.get_metrics(),
         "circuit_breakers": circuit_breakers_list,
+        "seo_analysis_queue": seo_analysis_queue.get_stats(),
+        "gemini_cache": gemini_client.get_cache_stats(),
         "memory_limits": {
             "max_extracted_size_mb": memory_guard.MAX_EXTRACTED_SIZE_BYTES / (1024 * 1024),
             "current_jobs": []  # TODO: Track active jobs if needed
@@ -41,6 +41,22 @@ async def get_rate_limiter_metrics():
     return rate_limiter.get_metrics()
 
 
+@router.get("/seo-queue")
+async def get_seo_queue_stats():
+    """
+    Get SEO analysis queue statistics
+    """
+    return seo_analysis_queue.get_stats()
+
+
+@router.get("/gemini-cache")
+async def get_gemini_cache_stats():
+    """
+    Get Gemini response cache statistics
+    """
+    return gemini_client.get_cache_stats()
+
+
 @router.get("/circuit-breaker/{job_id}")
 async def get_circuit_breaker_status(job_id: str):
     """
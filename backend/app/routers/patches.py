@@ -1,11 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
+from sqlalchemy import select, update, insert, not_
 from typing import List
+import asyncio
 import logging
 from datetime import datetime
 
-from app.database import get_db
+from app.database import get_db, AsyncSessionLocal
 from app.models import Issue, IssueStatus, PatchHistory
 from app.schemas import IssueApproval
 from app.services.patch_engine import patch_engine
@@ -16,36 +18,44 @@ from app.services.circuit_breaker import circuit_breaker
 router = APIRouter(prefix="/patches", tags=["patches"])
 logger = logging.getLogger(__name__)
 
+# Files patched in parallel by approve_issues
+PATCH_CONCURRENCY = 8
+
 
 @router.get("/history", response_model=List[dict])
 async def get_patch_history(
+    include_content: bool = True,
     db: AsyncSession = Depends(get_db)
 ):
     """
     Get all patch history
+    
+    Pass include_content=false to skip the original/patched file contents.
     """
+    columns = [
+        PatchHistory.id,
+        PatchHistory.job_id,
+        PatchHistory.issue_id,
+        PatchHistory.file_path,
+        Issue.line_number,
+        Issue.action,
+        PatchHistory.success,
+        PatchHistory.error_message,
+        PatchHistory.created_at.label("applied_at"),
+        not_(PatchHistory.rollback_available).label("rolled_back"),
+    ]
+    if include_content:
+        columns += [PatchHistory.original_content, PatchHistory.patched_content]
+    
     result = await db.execute(
-        select(PatchHistory).order_by(PatchHistory.created_at.desc())
+        select(*columns)
+        .outerjoin(Issue, Issue.id == PatchHistory.issue_id)
+        .order_by(PatchHistory.created_at.desc())
     )
-    history = result.scalars().all()
     
-    return [
-        {
-            "id": h.id,
-            "job_id": h.job_id,
-            "issue_id": h.issue_id,
-            "file_path": h.file_path,
-            "line_number": h.line_number,
-            "action": h.action,
-            "original_content": h.original_content,
-            "patched_content": h.patched_content,
-            "success": h.success,
-            "error_message": h.error_message,
-            "applied_at": h.applied_at.isoformat(),
-            "rolled_back": h.rolled_back,
-        }
-        for h in history
-    ]
+    # Returned directly: orjson encodes the rows (datetimes included) without
+    # a response_model validation pass over potentially large content columns
+    return ORJSONResponse([dict(row) for row in result.mappings()])
 
 
 @router.post("/{job_id}/issues/{issue_id}/approve")
@@ -64,7 +74,6 @@ async def approve_single_issue(
             .where(Issue.id == issue_id)
             .values(status=IssueStatus.APPROVED)
         )
-        await db.commit()
         
         logger.info(f"Approved issue {issue_id} for job {job_id}")
         return {"status": "approved", "issue_id": issue_id}
@@ -90,7 +99,6 @@ async def reject_single_issue(
             .where(Issue.id == issue_id)
             .values(status=IssueStatus.REJECTED)
         )
-        await db.commit()
         
         logger.info(f"Rejected issue {issue_id} for job {job_id}")
         return {"status": "rejected", "issue_id": issue_id}
@@ -100,6 +108,132 @@ async def reject_single_issue(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _apply_issue_patch(file_path: str, line_number: int, action: str, code: str) -> dict:
+    """
+    Back up, patch in the sandbox and validate a single issue
+    
+    Blocking file I/O and validation; runs in a worker thread.
+    Returns an outcome dict (no DB access here).
+    """
+    def validate_wrapper(temp_path):
+        file_type = temp_path.split('.')[-1]
+        return patch_engine.validate_patch(temp_path, f'.{file_type}')
+    
+    # Back up the original before the sandbox replaces it
+    try:
+        backup_path, original_bytes = patch_engine.create_backup(file_path)
+    except Exception as e:
+        return {"status": "backup_failed", "error": str(e)}
+    
+    # Decode before the sandbox swaps the patch in, so an undecodable
+    # file fails with its original still in place
+    try:
+        original_content = original_bytes.decode('utf-8')
+    except UnicodeDecodeError as e:
+        return {"status": "failed", "error": f"File is not valid UTF-8: {e}"}
+    
+    # SANDBOX: Apply patch to temp copy first. The original is already
+    # backed up and decoded above, so the temp copy gets neither again.
+    def apply_patch_wrapper(temp_path, *args, **kwargs):
+        try:
+            patch_engine.patch_file(temp_path, original_content, line_number, action, code)
+        except Exception as e:
+            return False, None, f"Failed to apply patch: {e}"
+        return True, None, None
+    
+    success, temp_path, error, patched_bytes = patch_sandbox.apply_and_validate(
+        original_path=file_path,
+        patch_func=apply_patch_wrapper,
+        validate_func=validate_wrapper
+    )
+    
+    # Cleanup temp file
+    patch_sandbox.cleanup_temp(temp_path)
+    
+    if not success:
+        return {"status": "failed", "error": error}
+    
+    # History contents come from the backup/sandbox buffers (the patch
+    # engine writes UTF-8, so the patched bytes always decode)
+    return {
+        "status": "applied",
+        "backup_path": backup_path,
+        "original_content": original_content,
+        "patched_content": patched_bytes.decode('utf-8', errors='replace')
+    }
+
+
+async def _mark_failed(db: AsyncSession, issue_id: int):
+    """Set an issue's status to FAILED"""
+    await db.execute(
+        update(Issue)
+        .where(Issue.id == issue_id)
+        .values(status=IssueStatus.FAILED)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def _record_outcome(db: AsyncSession, issue: Issue, outcome: dict) -> dict:
+    """
+    Commit one issue's status (and its history row) right after its patch
+    
+    If the write fails, a patch already swapped in on disk is restored from
+    its backup, so the file and the database never disagree.
+    """
+    try:
+        if outcome["status"] == "applied":
+            await db.execute(
+                update(Issue)
+                .where(Issue.id == issue.id)
+                .values(
+                    status=IssueStatus.APPLIED,
+                    backup_path=outcome["backup_path"],
+                    applied_at=datetime.utcnow()
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await db.execute(
+                insert(PatchHistory).values(
+                    issue_id=issue.id,
+                    job_id=issue.job_id,
+                    file_path=issue.file_path,
+                    backup_path=outcome["backup_path"],
+                    original_content=outcome["original_content"],
+                    patched_content=outcome["patched_content"],
+                    success=True,
+                    rollback_available=True
+                )
+            )
+        elif outcome["status"] in ("failed", "backup_failed"):
+            await _mark_failed(db, issue.id)
+        else:
+            return outcome
+        
+        await db.commit()
+        return outcome
+    
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Failed to record patch outcome for issue {issue.id}: {e}")
+        
+        if outcome["status"] == "applied":
+            restored = await asyncio.to_thread(
+                patch_engine.rollback, issue.file_path, outcome["backup_path"]
+            )
+            if not restored:
+                logger.error(f"Could not restore {issue.file_path} from {outcome['backup_path']}")
+        
+        # Best effort: the database may be what failed
+        try:
+            await _mark_failed(db, issue.id)
+            await db.commit()
+        except Exception as mark_error:
+            await db.rollback()
+            logger.error(f"Failed to mark issue {issue.id} as failed: {mark_error}")
+        
+        return {"issue_id": issue.id, "status": "transaction_failed", "error": str(e)}
+
+
 @router.post("/approve")
 async def approve_issues(
     approval: IssueApproval,
@@ -110,167 +244,83 @@ async def approve_issues(
     
     Safeguards:
     - Patches applied in sandbox (temp copy)
-    - DB operations wrapped in transaction
+    - Issues on the same file are patched one after another; different
+      files are patched in parallel worker threads
+    - Each issue's outcome is committed as soon as it is known; a patch
+      whose write fails is undone on disk
     - Circuit breaker stops after 5 failures
     """
     try:
-        results = []
-        job_id = None
+        # Prefetch all issues in one query
+        result = await db.execute(select(Issue).where(Issue.id.in_(approval.issue_ids)))
+        issues_by_id = {issue.id: issue for issue in result.scalars()}
         
-        for issue_id in approval.issue_ids:
-            # Get issue
-            result = await db.execute(select(Issue).where(Issue.id == issue_id))
-            issue = result.scalar_one_or_none()
-            
-            if not issue:
-                results.append({
-                    "issue_id": issue_id,
-                    "status": "not_found"
-                })
-                continue
-            
-            # Track job_id for circuit breaker
-            if job_id is None:
-                job_id = issue.job_id
-            
-            # CIRCUIT BREAKER: Check if tripped
-            if circuit_breaker.is_tripped(issue.job_id):
-                results.append({
-                    "issue_id": issue_id,
-                    "status": "circuit_breaker_tripped",
-                    "message": f"Circuit breaker tripped for job {issue.job_id}. Too many failures."
-                })
-                continue
-            
-            # CIRCUIT BREAKER: Check if too many failures
-            if circuit_breaker.is_tripped(issue.job_id):
-                logger.error(
-                    f"Circuit breaker tripped for job {issue.job_id}. "
-                    f"Stopping further patches."
-                )
-                results.append({
-                    "issue_id": issue_id,
-                    "status": "circuit_breaker_tripped",
-                    "message": "Too many failures, auto-stopped"
-                })
-                continue
-            
-            # Use edited code if provided
-            code_to_apply = approval.edited_code if approval.edited_code else issue.code
-            
-            # SANDBOX: Apply patch to temp copy first
-            def apply_patch_wrapper(temp_path, *args, **kwargs):
-                return patch_engine.apply_patch(
-                    file_path=temp_path,
-                    line_number=issue.line_number,
-                    action=issue.action,
-                    code=code_to_apply,
-                    file_type=None
-                )
-            
-            def validate_wrapper(temp_path):
-                file_type = temp_path.split('.')[-1]
-                return patch_engine.validate_patch(temp_path, f'.{file_type}')
-            
-            success, temp_path, error = patch_sandbox.apply_and_validate(
-                original_path=issue.file_path,
-                patch_func=apply_patch_wrapper,
-                validate_func=validate_wrapper
-            )
-            
-            if success:
-                # DB TRANSACTION: Wrap all updates atomically
-                try:
-                    # Create backup
-                    backup_path = patch_engine.create_backup(issue.file_path)
-                    
-                    # Read contents for history
-                    with open(issue.file_path, 'r') as f:
-                        patched_content = f.read()
-                    
-                    with open(backup_path, 'r') as f:
-                        original_content = f.read()
-                    
-                    # Atomic transaction: issue + history + status
-                    async with db.begin():
-                        # Update issue
-                        await db.execute(
-                            update(Issue)
-                            .where(Issue.id == issue_id)
-                            .values(
-                                status=IssueStatus.APPLIED,
-                                backup_path=backup_path,
-                                applied_at=datetime.utcnow()
-                            )
-                        )
-                        
-                        # Create patch history
-                        history = PatchHistory(
-                            issue_id=issue_id,
-                            job_id=issue.job_id,
-                            file_path=issue.file_path,
-                            backup_path=backup_path,
-                            original_content=original_content,
-                            patched_content=patched_content,
-                            success=True,
-                            rollback_available=True
-                        )
-                        db.add(history)
-                    
-                    # Circuit breaker: record success
-                    circuit_breaker.record_success(issue.job_id)
+        # Group by file, keeping request order within each file
+        issues_by_file = {}
+        for issue_id in dict.fromkeys(approval.issue_ids):
+            issue = issues_by_id.get(issue_id)
+            if issue:
+                issues_by_file.setdefault(issue.file_path, []).append(issue)
+        
+        outcomes = {}
+        semaphore = asyncio.Semaphore(PATCH_CONCURRENCY)
+        
+        async def process_file(file_issues: list):
+            # Own session per file: sessions must not be shared across tasks
+            async with semaphore, AsyncSessionLocal() as file_db:
+                for issue in file_issues:
+                    # CIRCUIT BREAKER: Check if tripped
+                    if circuit_breaker.is_tripped(issue.job_id):
+                        outcomes[issue.id] = {
+                            "issue_id": issue.id,
+                            "status": "circuit_breaker_tripped",
+                            "message": f"Circuit breaker tripped for job {issue.job_id}. Too many failures."
+                        }
+                        continue
                     
-                    # Cleanup temp file
-                    patch_sandbox.cleanup_temp(temp_path)
+                    # Use edited code if provided
+                    code_to_apply = approval.edited_code if approval.edited_code else issue.code
                     
-                    results.append({
-                        "issue_id": issue_id,
-                        "status": "applied",
-                        "backup_path": backup_path
-                    })
-                
-                except Exception as e:
-                    logger.error(f"Transaction failed for issue {issue_id}: {e}")
+                    outcome = await asyncio.to_thread(
+                        _apply_issue_patch,
+                        issue.file_path,
+                        issue.line_number,
+                        issue.action,
+                        code_to_apply
+                    )
+                    outcome["issue_id"] = issue.id
+                    outcome = await _record_outcome(file_db, issue, outcome)
                     
-                    # Circuit breaker: record failure
-                    circuit_breaker.record_failure(issue.job_id)
+                    # Circuit breaker bookkeeping stays on the event loop thread
+                    if outcome["status"] == "applied":
+                        circuit_breaker.record_success(issue.job_id)
+                    else:
+                        logger.error(f"Patch failed for issue {issue.id}: {outcome['error']}")
+                        if circuit_breaker.record_failure(issue.job_id):
+                            logger.error(f"Stopping further patches for job {issue.job_id}")
+                        if outcome["status"] == "failed":
+                            outcome["circuit_breaker_status"] = circuit_breaker.get_status(issue.job_id)
                     
-                    results.append({
-                        "issue_id": issue_id,
-                        "status": "transaction_failed",
-                        "error": str(e)
-                    })
+                    outcomes[issue.id] = outcome
+        
+        await asyncio.gather(*(process_file(file_issues) for file_issues in issues_by_file.values()))
+        
+        # Build results in request order
+        results = []
+        for issue_id in approval.issue_ids:
+            outcome = outcomes.get(issue_id)
             
-            else:
-                # Patch failed in sandbox
-                logger.error(f"Patch failed for issue {issue_id}: {error}")
-                
-                # Circuit breaker: record failure
-                should_stop = circuit_breaker.record_failure(issue.job_id)
-                
-                # DB transaction: update issue status
-                async with db.begin():
-                    await db.execute(
-                        update(Issue)
-                        .where(Issue.id == issue_id)
-                        .values(status=IssueStatus.FAILED)
-                    )
-                
-                # Cleanup temp file
-                patch_sandbox.cleanup_temp(temp_path)
-                
+            if outcome is None:
                 results.append({
                     "issue_id": issue_id,
-                    "status": "failed",
-                    "error": error,
-                    "circuit_breaker_status": circuit_breaker.get_status(issue.job_id)
+                    "status": "not_found"
                 })
-                
-                if should_stop:
-                    logger.error(f"Stopping further patches for job {issue.job_id}")
-                    break
-        
-        await db.commit()
+                continue
+            
+            results.append({
+                key: value for key, value in outcome.items()
+                if key not in ("original_content", "patched_content")
+            })
         
         logger.info(f"Processed {len(approval.issue_ids)} patch approvals")
         
@@ -293,15 +343,15 @@ async def reject_issues(
     Reject selected issues
     """
     try:
-        for issue_id in issue_ids:
+        # Single UPDATE for all ids
+        if issue_ids:
             await db.execute(
                 update(Issue)
-                .where(Issue.id == issue_id)
+                .where(Issue.id.in_(issue_ids))
                 .values(status=IssueStatus.REJECTED)
+                .execution_options(synchronize_session=False)
             )
         
-        await db.commit()
-        
         logger.info(f"Rejected {len(issue_ids)} issues")
         
         return {
@@ -322,11 +372,12 @@ async def rollback_patch(
     Rollback a previously applied patch
     """
     try:
-        # Get patch history
+        # Get latest patch history entry
         result = await db.execute(
             select(PatchHistory)
             .where(PatchHistory.issue_id == issue_id)
             .order_by(PatchHistory.created_at.desc())
+            .limit(1)
         )
         history = result.scalar_one_or_none()
         
@@ -354,8 +405,6 @@ async def rollback_patch(
                 .values(rollback_available=False)
             )
             
-            await db.commit()
-            
             logger.info(f"Rolled back patch for issue {issue_id}")
             
             return {
@@ -4,14 +4,19 @@ Endpoints for SEO analysis
 """
 import asyncio
 import logging
-import uuid
-from datetime import datetime
+from collections import Counter
+from functools import lru_cache
+from datetime import datetime, timezone
 from typing import List, Optional
-from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
+from pydantic import ValidationError
+from sqlalchemy import select, desc, delete, insert, update
+from sqlalchemy.orm import selectinload
 
-from app.database import get_db
+from app.database import get_db, AsyncSessionLocal
 from app.models.seo_models import SEOAnalysis, SEOIssue, SEOMetric, SEOAnalysisStatus
 from app.schemas.seo_schemas import (
     SEOAnalysisRequest,
@@ -25,7 +30,10 @@ from app.schemas.seo_schemas import (
 from app.services.seo_crawler import SEOCrawler, HTMLAnalyzer
 from app.services.seo_analyzer import SEOAnalyzer
 from app.services.seo_report_generator import SEOReportGenerator
-from app.services.gemini_client import GeminiClient
+from app.services.gemini_client import GeminiClient, gemini_client
+from app.services.response_cache import response_cache
+from app.services.id_generator import uuid7
+from app.services.task_queue import seo_analysis_queue, QueueFullError
 from app.config import get_settings
 
 settings = get_settings()
@@ -33,35 +41,120 @@ settings = get_settings()
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/seo", tags=["SEO Spider"])
 
+# Response cache TTLs (seconds) for the polled read endpoints
+DETAIL_CACHE_TTL_FINAL = 300
+DETAIL_CACHE_TTL_RUNNING = 2
+PROGRESS_CACHE_TTL = 1
 
-# Dependency for services
-def get_gemini_client():
-    return GeminiClient()
+ANALYSIS_QUEUE_FULL_DETAIL = "Too many analyses queued, try again later"
 
+# Schema.org types every page is expected to declare (report order)
+RECOMMENDED_SCHEMAS = ("Organization", "WebSite", "WebPage", "BreadcrumbList")
 
-def get_seo_analyzer(gemini: GeminiClient = Depends(get_gemini_client)):
-    return SEOAnalyzer(gemini)
+# Progress percentage and message per analysis status
+_PROGRESS_PERCENTAGES = {
+    SEOAnalysisStatus.PENDING: 0.0,
+    SEOAnalysisStatus.CRAWLING: 25.0,
+    SEOAnalysisStatus.ANALYZING: 50.0,
+    SEOAnalysisStatus.GENERATING_REPORT: 75.0,
+    SEOAnalysisStatus.COMPLETED: 100.0,
+    SEOAnalysisStatus.FAILED: 0.0
+}
 
+_PROGRESS_MESSAGES = {
+    SEOAnalysisStatus.PENDING: "Analiz başlatılıyor...",
+    SEOAnalysisStatus.CRAWLING: "Sayfa taranıyor...",
+    SEOAnalysisStatus.ANALYZING: "SEO analizi yapılıyor...",
+    SEOAnalysisStatus.GENERATING_REPORT: "Rapor oluşturuluyor...",
+    SEOAnalysisStatus.COMPLETED: "Analiz tamamlandı!",
+    SEOAnalysisStatus.FAILED: "Analiz başarısız oldu."
+}
 
-def get_report_generator():
+# Columns backing SEOAnalysisResponse, used by list_analyses
+_SUMMARY_COLUMNS = tuple(getattr(SEOAnalysis, name) for name in SEOAnalysisResponse.model_fields)
+
+
+def _construct_from_row(schema, row):
+    """Build a response schema from an ORM row without re-validating trusted DB data"""
+    return schema.model_construct(**{name: getattr(row, name) for name in schema.model_fields})
+
+
+def _detail_cache_key(analysis_id: str) -> str:
+    return f"seo:analysis:{analysis_id}:detail"
+
+
+def _progress_cache_key(analysis_id: str) -> str:
+    return f"seo:analysis:{analysis_id}:progress"
+
+
+def _invalidate_analysis_cache(analysis_id: str):
+    """Drop cached read responses after an analysis row changes"""
+    response_cache.delete(_detail_cache_key(analysis_id), _progress_cache_key(analysis_id))
+
+
+def _cached_json(key: str) -> Optional[Response]:
+    """Serve a cached JSON body, if present"""
+    body = response_cache.get(key)
+    if body is None:
+        return None
+    return Response(content=body, media_type="application/json")
+
+
+# Dependencies for services (built once, shared across requests)
+def get_gemini_client() -> GeminiClient:
+    return gemini_client
+
+
+@lru_cache(maxsize=1)
+def get_seo_analyzer() -> SEOAnalyzer:
+    return SEOAnalyzer(gemini_client)
+
+
+@lru_cache(maxsize=1)
+def get_report_generator() -> SEOReportGenerator:
     return SEOReportGenerator()
 
 
-@router.post("/analyze", response_model=SEOAnalysisResponse)
+async def parse_analysis_request(raw_request: Request) -> SEOAnalysisRequest:
+    """Parse and validate the request body in a single pass with pydantic-core"""
+    body = await raw_request.body()
+    try:
+        return SEOAnalysisRequest.model_validate_json(body)
+    except ValidationError as e:
+        # Same 422 shape FastAPI produces for body validation errors
+        raise RequestValidationError(
+            [{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)],
+            body=body
+        )
+
+
+@router.post(
+    "/analyze",
+    response_model=SEOAnalysisResponse,
+    # The body is parsed by parse_analysis_request, so document it explicitly
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": SEOAnalysisRequest.model_json_schema()}}
+        }
+    }
+)
 async def start_seo_analysis(
-    request: SEOAnalysisRequest,
-    background_tasks: BackgroundTasks,
+    request: SEOAnalysisRequest = Depends(parse_analysis_request),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Start a new SEO analysis
     
     This endpoint initiates the analysis and returns immediately.
-    The analysis runs in the background.
+    The analysis is queued for the SEO analysis workers.
     """
     
-    # Generate analysis ID
-    analysis_id = str(uuid.uuid4())
+    if seo_analysis_queue.is_full():
+        raise HTTPException(status_code=503, detail=ANALYSIS_QUEUE_FULL_DETAIL)
+    
+    # Generate analysis ID (time-ordered, keeps PK inserts index-local)
+    analysis_id = str(uuid7())
     
     # Create analysis record
     analysis = SEOAnalysis(
@@ -69,20 +162,32 @@ async def start_seo_analysis(
         url=request.url,
         keywords=request.keywords,
         status=SEOAnalysisStatus.PENDING,
-        keyword_scores={}
+        keyword_scores={},
+        # Set here so the response needs no refresh SELECT
+        created_at=datetime.now(timezone.utc)
     )
     
     db.add(analysis)
+    # Committed before queueing: a worker may pick the job up immediately
     await db.commit()
-    await db.refresh(analysis)
     
-    # Start analysis in background
-    background_tasks.add_task(
-        run_seo_analysis,
-        analysis_id=analysis_id,
-        url=request.url,
-        keywords=request.keywords
-    )
+    try:
+        seo_analysis_queue.enqueue(
+            run_seo_analysis,
+            analysis_id=analysis_id,
+            url=request.url,
+            keywords=request.keywords
+        )
+    except QueueFullError:
+        # Filled up while the row was committed: record why it never ran
+        await db.execute(
+            _update_analysis_stmt(analysis_id).values(
+                status=SEOAnalysisStatus.FAILED,
+                error_message=ANALYSIS_QUEUE_FULL_DETAIL
+            )
+        )
+        await db.commit()
+        raise HTTPException(status_code=503, detail=ANALYSIS_QUEUE_FULL_DETAIL)
     
     logger.info(f"Started SEO analysis {analysis_id} for {request.url}")
     
@@ -112,32 +217,36 @@ async def get_analysis(
 ):
     """Get SEO analysis results with details"""
     
-    # Get analysis
-    result = await db.execute(select(SEOAnalysis).where(SEOAnalysis.id == analysis_id))
+    cache_key = _detail_cache_key(analysis_id)
+    cached = _cached_json(cache_key)
+    if cached is not None:
+        return cached
+    
+    # Get analysis with its issues and metrics
+    result = await db.execute(
+        select(SEOAnalysis)
+        .options(selectinload(SEOAnalysis.issues), selectinload(SEOAnalysis.metric))
+        .where(SEOAnalysis.id == analysis_id)
+    )
     analysis = result.scalar_one_or_none()
     if not analysis:
         raise HTTPException(status_code=404, detail="Analysis not found")
     
-    # Get issues
-    issues_result = await db.execute(select(SEOIssue).where(SEOIssue.analysis_id == analysis_id))
-    issues = issues_result.scalars().all()
-    
-    # Get metrics
-    metrics_result = await db.execute(select(SEOMetric).where(SEOMetric.analysis_id == analysis_id))
-    metrics = metrics_result.scalar_one_or_none()
+    issues = analysis.issues
+    metrics = analysis.metric
     
     # Convert keyword_scores to KeywordScore objects
     keyword_scores = {}
     if analysis.keyword_scores:
         for kw, score_data in analysis.keyword_scores.items():
-            keyword_scores[kw] = KeywordScore(**score_data)
+            keyword_scores[kw] = KeywordScore.model_construct(**score_data)
     
     # Get detected data from metadata
     detected_data = None
     if analysis.analysis_metadata and 'detected_data' in analysis.analysis_metadata:
         detected_data = analysis.analysis_metadata['detected_data']
     
-    return SEOAnalysisDetailResponse(
+    response = SEOAnalysisDetailResponse(
         id=analysis.id,
         url=analysis.url,
         keywords=analysis.keywords,
@@ -160,10 +269,23 @@ async def get_analysis(
         created_at=analysis.created_at,
         updated_at=analysis.updated_at,
         completed_at=analysis.completed_at,
-        issues=[SEOIssueResponse.model_validate(issue) for issue in issues],
-        metrics=SEOMetricResponse.model_validate(metrics) if metrics else None,
+        issues=[_construct_from_row(SEOIssueResponse, issue) for issue in issues],
+        metrics=_construct_from_row(SEOMetricResponse, metrics) if metrics else None,
         detected_data=detected_data
     )
+    
+    # Returned directly: skips FastAPI's re-validation and jsonable_encoder pass
+    # (response_model is kept for the OpenAPI schema)
+    json_response = ORJSONResponse(response.model_dump())
+    
+    # Finished analyses no longer change; running ones are polled
+    if analysis.status in (SEOAnalysisStatus.COMPLETED, SEOAnalysisStatus.FAILED):
+        ttl = DETAIL_CACHE_TTL_FINAL
+    else:
+        ttl = DETAIL_CACHE_TTL_RUNNING
+    response_cache.set(cache_key, json_response.body, ttl)
+    
+    return json_response
 
 
 @router.get("/analyze/{analysis_id}/progress", response_model=AnalysisProgress)
@@ -173,88 +295,58 @@ async def get_analysis_progress(
 ):
     """Get analysis progress status"""
     
+    cache_key = _progress_cache_key(analysis_id)
+    cached = _cached_json(cache_key)
+    if cached is not None:
+        return cached
+    
     result = await db.execute(select(SEOAnalysis).where(SEOAnalysis.id == analysis_id))
     analysis = result.scalar_one_or_none()
     if not analysis:
         raise HTTPException(status_code=404, detail="Analysis not found")
     
-    # Calculate progress percentage
-    progress_map = {
-        SEOAnalysisStatus.PENDING: 0,
-        SEOAnalysisStatus.CRAWLING: 25,
-        SEOAnalysisStatus.ANALYZING: 50,
-        SEOAnalysisStatus.GENERATING_REPORT: 75,
-        SEOAnalysisStatus.COMPLETED: 100,
-        SEOAnalysisStatus.FAILED: 0
-    }
-    
-    status_messages = {
-        SEOAnalysisStatus.PENDING: "Analiz başlatılıyor...",
-        SEOAnalysisStatus.CRAWLING: "Sayfa taranıyor...",
-        SEOAnalysisStatus.ANALYZING: "SEO analizi yapılıyor...",
-        SEOAnalysisStatus.GENERATING_REPORT: "Rapor oluşturuluyor...",
-        SEOAnalysisStatus.COMPLETED: "Analiz tamamlandı!",
-        SEOAnalysisStatus.FAILED: "Analiz başarısız oldu."
-    }
-    
-    return AnalysisProgress(
+    # Built from the DB row and fixed lookup tables: no validation needed
+    progress = AnalysisProgress.model_construct(
         analysis_id=analysis.id,
         status=analysis.status,
-        progress_percentage=progress_map.get(analysis.status, 0),
+        progress_percentage=_PROGRESS_PERCENTAGES.get(analysis.status, 0.0),
         current_step=analysis.status.value,
-        message=status_messages.get(analysis.status, "İşleniyor...")
+        message=_PROGRESS_MESSAGES.get(analysis.status, "İşleniyor...")
     )
+    
+    json_response = ORJSONResponse(progress.model_dump())
+    response_cache.set(cache_key, json_response.body, PROGRESS_CACHE_TTL)
+    
+    return json_response
 
 
 @router.get("/analyses", response_model=List[SEOAnalysisResponse])
 async def list_analyses(
     skip: int = 0,
     limit: int = 20,
+    before: Optional[datetime] = None,
     db: AsyncSession = Depends(get_db)
 ):
-    """List all SEO analyses"""
+    """
+    List all SEO analyses
     
-    result = await db.execute(
-        select(SEOAnalysis)
-        .order_by(desc(SEOAnalysis.created_at))
-        .offset(skip)
-        .limit(limit)
-    )
-    analyses = result.scalars().all()
+    Pass the last seen created_at as `before` to page without OFFSET scans
+    """
+    
+    # Only the summary columns (never html_content), as plain rows
+    query = select(*_SUMMARY_COLUMNS).order_by(desc(SEOAnalysis.created_at))
+    if before is not None:
+        query = query.where(SEOAnalysis.created_at < before)
+    
+    result = await db.execute(query.offset(skip).limit(limit))
     
     results = []
-    for analysis in analyses:
-        keyword_scores = {}
-        if analysis.keyword_scores:
-            for kw, score_data in analysis.keyword_scores.items():
-                keyword_scores[kw] = KeywordScore(**score_data)
-        
-        results.append(SEOAnalysisResponse(
-            id=analysis.id,
-            url=analysis.url,
-            keywords=analysis.keywords,
-            status=analysis.status,
-            page_title=analysis.page_title,
-            meta_description=analysis.meta_description,
-            word_count=analysis.word_count,
-            total_issues=analysis.total_issues,
-            critical_issues=analysis.critical_issues,
-            high_issues=analysis.high_issues,
-            medium_issues=analysis.medium_issues,
-            low_issues=analysis.low_issues,
-            keyword_scores=keyword_scores,
-            overall_score=analysis.overall_score,
-            technical_score=analysis.technical_score,
-            content_score=analysis.content_score,
-            html_report_path=analysis.html_report_path,
-            pdf_report_path=analysis.pdf_report_path,
-            error_message=analysis.error_message,
-            created_at=analysis.created_at,
-            updated_at=analysis.updated_at,
-            completed_at=analysis.completed_at
-        ))
-    
-    return results
+    for row in result.mappings():
+        item = dict(row)
+        item['keyword_scores'] = item['keyword_scores'] or {}
+        results.append(item)
+    
+    return ORJSONResponse(results)
 
 
 @router.delete("/analyze/{analysis_id}")
@@ -264,49 +356,79 @@ async def delete_analysis(
 ):
     """Delete an SEO analysis"""
     
-    result = await db.execute(select(SEOAnalysis).where(SEOAnalysis.id == analysis_id))
-    analysis = result.scalar_one_or_none()
-    if not analysis:
-        raise HTTPException(status_code=404, detail="Analysis not found")
-    
-    # Delete related records
-    issues_result = await db.execute(select(SEOIssue).where(SEOIssue.analysis_id == analysis_id))
-    issues = issues_result.scalars().all()
-    for issue in issues:
-        await db.delete(issue)
+    # Bulk child deletes cover databases created before the ON DELETE CASCADE FK
+    await db.execute(delete(SEOIssue).where(SEOIssue.analysis_id == analysis_id))
+    await db.execute(delete(SEOMetric).where(SEOMetric.analysis_id == analysis_id))
     
-    metrics_result = await db.execute(select(SEOMetric).where(SEOMetric.analysis_id == analysis_id))
-    metrics = metrics_result.scalar_one_or_none()
-    if metrics:
-        await db.delete(metrics)
+    result = await db.execute(
+        delete(SEOAnalysis).where(SEOAnalysis.id == analysis_id).returning(SEOAnalysis.id)
+    )
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(status_code=404, detail="Analysis not found")
     
-    await db.delete(analysis)
+    # Commit before invalidating: a read in between would cache the
+    # still-visible row again
     await db.commit()
+    _invalidate_analysis_cache(analysis_id)
     
     return {"message": "Analysis deleted successfully"}
 
 
-# Background task function
+def _update_analysis_stmt(analysis_id: str):
+    """UPDATE of a single analysis row; callers add only the changed columns"""
+    return (
+        update(SEOAnalysis)
+        .where(SEOAnalysis.id == analysis_id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def fail_interrupted_analyses(analysis_ids: List[str]):
+    """
+    Mark analyses the queue dropped or cancelled on shutdown as FAILED
+    
+    Nothing requeues them, so they would otherwise stay in a running
+    status forever.
+    """
+    if not analysis_ids:
+        return
+    
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(SEOAnalysis)
+            .where(SEOAnalysis.id.in_(analysis_ids))
+            .values(status=SEOAnalysisStatus.FAILED, error_message="Interrupted by server shutdown")
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+    
+    for analysis_id in analysis_ids:
+        _invalidate_analysis_cache(analysis_id)
+    logger.warning(f"Marked {len(analysis_ids)} interrupted analyses as failed")
+
+
+# Queued job (see seo_analysis_queue)
 async def run_seo_analysis(analysis_id: str, url: str, keywords: List[str]):
     """
     Run complete SEO analysis pipeline
     
-    This function runs in the background and updates the database
+    Runs on an SEO analysis queue worker and updates the database
     """
     
-    from app.database import AsyncSessionLocal
     async with AsyncSessionLocal() as db:
         try:
-            result = await db.execute(select(SEOAnalysis).where(SEOAnalysis.id == analysis_id))
-            analysis = result.scalar_one_or_none()
-            if not analysis:
-                logger.error(f"Analysis {analysis_id} not found")
-                return
-            
             # Step 1: Crawl
             logger.info(f"[{analysis_id}] Starting crawl...")
-            analysis.status = SEOAnalysisStatus.CRAWLING
+            result = await db.execute(
+                _update_analysis_stmt(analysis_id)
+                .values(status=SEOAnalysisStatus.CRAWLING)
+                .returning(SEOAnalysis.id)
+            )
+            if result.scalar_one_or_none() is None:
+                logger.error(f"Analysis {analysis_id} not found")
+                return
             await db.commit()
+            _invalidate_analysis_cache(analysis_id)
             
             async with SEOCrawler() as crawler:
                 crawl_result = await crawler.crawl(url, analysis_id)
@@ -314,13 +436,6 @@ async def run_seo_analysis(analysis_id: str, url: str, keywords: List[str]):
                 if crawl_result.error:
                     raise Exception(f"Crawl error: {crawl_result.error}")
                 
-                # Update analysis with crawl data
-                analysis.html_content = crawl_result.html_content
-                analysis.screenshot_path = crawl_result.screenshot_path
-                analysis.page_title = crawl_result.page_title
-                analysis.meta_description = crawl_result.meta_description
-                await db.commit()
-                
                 # Extract metrics using HTMLAnalyzer
                 html_analyzer = HTMLAnalyzer(crawl_result.html_content, url)
                 
@@ -332,27 +447,33 @@ async def run_seo_analysis(analysis_id: str, url: str, keywords: List[str]):
                 word_count = html_analyzer.calculate_word_count()
                 keyword_density = html_analyzer.calculate_keyword_density(keywords)
                 
-                # Check robots.txt and sitemap
-                robots_data = await crawler.check_robots_txt(url)
-                sitemap_data = await crawler.check_sitemap(url)
-                
-                # Check broken links (check internal links only, max 20)
+                # Check robots.txt, sitemap and broken links (internal links only, max 20)
+                # concurrently; each check uses its own HTTP client
                 all_links_to_check = links['internal_links'][:20]
-                broken_links_result = await crawler.check_broken_links(all_links_to_check, max_checks=20)
+                robots_data, sitemap_data, broken_links_result = await asyncio.gather(
+                    crawler.check_robots_txt(url),
+                    crawler.check_sitemap(url),
+                    crawler.check_broken_links(all_links_to_check, max_checks=20)
+                )
                 broken_links_count = broken_links_result['broken_count']
                 
                 # Create metrics record
-                recommended_schemas = ["Organization", "WebSite", "WebPage", "BreadcrumbList"]
-                missing_schemas = [s for s in recommended_schemas if s not in schemas]
+                found_schemas = set(schemas)
+                missing_schemas = [s for s in RECOMMENDED_SCHEMAS if s not in found_schemas]
+                
+                # Lowercase once for the keyword match checks
+                keywords_lc = [kw.lower() for kw in keywords]
+                title_lc = (crawl_result.page_title or "").lower()
+                meta_lc = (crawl_result.meta_description or "").lower()
                 
                 metrics = SEOMetric(
                     analysis_id=analysis_id,
                     schemas_found=schemas,
                     schemas_missing=missing_schemas,
                     title_length=len(crawl_result.page_title) if crawl_result.page_title else 0,
-                    title_keyword_match=any(kw.lower() in (crawl_result.page_title or "").lower() for kw in keywords),
+                    title_keyword_match=any(kw in title_lc for kw in keywords_lc),
                     meta_length=len(crawl_result.meta_description) if crawl_result.meta_description else 0,
-                    meta_keyword_match=any(kw.lower() in (crawl_result.meta_description or "").lower() for kw in keywords),
+                    meta_keyword_match=any(kw in meta_lc for kw in keywords_lc),
                     h1_count=headings['h1_count'],
                     h2_count=headings['h2_count'],
                     h3_count=headings['h3_count'],
@@ -371,16 +492,24 @@ async def run_seo_analysis(analysis_id: str, url: str, keywords: List[str]):
                 )
                 
                 db.add(metrics)
-                analysis.word_count = word_count
+                
+                # Crawl data, word count and metrics in one transaction
+                await db.execute(
+                    _update_analysis_stmt(analysis_id).values(
+                        html_content=crawl_result.html_content,
+                        screenshot_path=crawl_result.screenshot_path,
+                        page_title=crawl_result.page_title,
+                        meta_description=crawl_result.meta_description,
+                        word_count=word_count
+                    )
+                )
                 await db.commit()
+                _invalidate_analysis_cache(analysis_id)
             
             # Step 2: Analyze with Gemini
             logger.info(f"[{analysis_id}] Starting AI analysis...")
-            analysis.status = SEOAnalysisStatus.ANALYZING
-            await db.commit()
             
-            gemini_client = GeminiClient()
-            analyzer = SEOAnalyzer(gemini_client)
+            analyzer = get_seo_analyzer()
             
             # Get anchor texts for natural anchor text analysis
             anchor_texts = links.get('anchor_texts', [])
@@ -399,30 +528,56 @@ async def run_seo_analysis(analysis_id: str, url: str, keywords: List[str]):
                 'has_no_h1': headings.get('has_no_h1', False)
             }
             
-            analysis_result = await analyzer.analyze_html(
-                analysis.html_content,
+            # Start the Gemini call first; the status commit and report
+            # inputs below are prepared while it is in flight
+            gemini_task = asyncio.create_task(analyzer.analyze_html(
+                crawl_result.html_content,
                 url,
                 keywords,
                 anchor_texts=anchor_texts,
                 real_data=real_data
-            )
+            ))
+            try:
+                await db.execute(
+                    _update_analysis_stmt(analysis_id).values(status=SEOAnalysisStatus.ANALYZING)
+                )
+                await db.commit()
+                _invalidate_analysis_cache(analysis_id)
+                
+                # Prepare detected data for report
+                detected_data = {
+                    'h1_texts': headings.get('h1_texts', []),
+                    'title': crawl_result.page_title,
+                    'meta_description': crawl_result.meta_description,
+                    'schemas': schemas,
+                    'anchor_texts': anchor_texts[:15],  # First 15 anchor texts
+                    'external_links': links.get('external_links', [])[:10]  # First 10 external links
+                }
+            except BaseException:
+                gemini_task.cancel()
+                raise
             
-            # Save issues
-            severity_counts = {'critical': 0, 'high': 0, 'medium': 0, 'low': 0}
+            analysis_result = await gemini_task
             
-            for gemini_issue in analysis_result.issues:
-                issue = SEOIssue(
-                    analysis_id=analysis_id,
-                    issue_type=gemini_issue.type,
-                    severity=gemini_issue.severity,
-                    confidence=gemini_issue.confidence,
-                    line=gemini_issue.line,
-                    reason=gemini_issue.reason,
-                    recommendation=gemini_issue.recommendation,
-                    example_fix=gemini_issue.example_fix
-                )
-                db.add(issue)
-                severity_counts[gemini_issue.severity.value] += 1
+            # Save issues in a single executemany INSERT; the returned rows feed the report
+            issue_rows = [
+                {
+                    "analysis_id": analysis_id,
+                    "issue_type": gemini_issue.type,
+                    "severity": gemini_issue.severity,
+                    "confidence": gemini_issue.confidence,
+                    "line": gemini_issue.line,
+                    "reason": gemini_issue.reason,
+                    "recommendation": gemini_issue.recommendation,
+                    "example_fix": gemini_issue.example_fix
+                }
+                for gemini_issue in analysis_result.issues
+            ]
+            issues = []
+            if issue_rows:
+                issues = (await db.scalars(insert(SEOIssue).returning(SEOIssue), issue_rows)).all()
+            
+            severity_counts = Counter(gemini_issue.severity.value for gemini_issue in analysis_result.issues)
             
             # Calculate scores
             scores = analyzer.calculate_overall_score(
@@ -430,16 +585,6 @@ async def run_seo_analysis(analysis_id: str, url: str, keywords: List[str]):
                 analysis_result.keyword_scores
             )
             
-            # Update analysis with results
-            analysis.total_issues = len(analysis_result.issues)
-            analysis.critical_issues = severity_counts['critical']
-            analysis.high_issues = severity_counts['high']
-            analysis.medium_issues = severity_counts['medium']
-            analysis.low_issues = severity_counts['low']
-            analysis.overall_score = scores['overall_score']
-            analysis.technical_score = scores['technical_score']
-            analysis.content_score = scores['content_score']
-            
             # Convert keyword scores to dict
             keyword_scores_dict = {}
             for kw, score in analysis_result.keyword_scores.items():
@@ -448,74 +593,77 @@ async def run_seo_analysis(analysis_id: str, url: str, keywords: List[str]):
                     'prominence': score.prominence,
                     'recommendation': score.recommendation
                 }
-            analysis.keyword_scores = keyword_scores_dict
-            
-            await db.commit()
             
-            # Step 3: Generate reports
+            # Results and the move to report generation in a single UPDATE
             logger.info(f"[{analysis_id}] Generating reports...")
-            analysis.status = SEOAnalysisStatus.GENERATING_REPORT
+            await db.execute(
+                _update_analysis_stmt(analysis_id).values(
+                    total_issues=len(analysis_result.issues),
+                    critical_issues=severity_counts['critical'],
+                    high_issues=severity_counts['high'],
+                    medium_issues=severity_counts['medium'],
+                    low_issues=severity_counts['low'],
+                    overall_score=scores['overall_score'],
+                    technical_score=scores['technical_score'],
+                    content_score=scores['content_score'],
+                    keyword_scores=keyword_scores_dict,
+                    status=SEOAnalysisStatus.GENERATING_REPORT
+                )
+            )
             await db.commit()
+            _invalidate_analysis_cache(analysis_id)
             
-            report_gen = SEOReportGenerator()
-            
-            # Get issues and metrics for report
-            issues_result = await db.execute(select(SEOIssue).where(SEOIssue.analysis_id == analysis_id))
-            issues = issues_result.scalars().all()
-            metrics_result = await db.execute(select(SEOMetric).where(SEOMetric.analysis_id == analysis_id))
-            metrics = metrics_result.scalar_one_or_none()
-            
-            # Prepare detected data for report
-            detected_data = {
-                'h1_texts': headings.get('h1_texts', []),
-                'title': crawl_result.page_title,
-                'meta_description': crawl_result.meta_description,
-                'schemas': schemas,
-                'anchor_texts': links.get('anchor_texts', [])[:15],  # First 15 anchor texts
-                'external_links': links.get('external_links', [])[:10]  # First 10 external links
-            }
+            # Step 3: Generate reports
+            report_gen = get_report_generator()
             
+            # Report rendering is CPU-bound (Jinja, WeasyPrint): keep it off the event loop
             # Generate HTML report
-            html_path = report_gen.generate_html_report(
+            html_path = await asyncio.to_thread(
+                report_gen.generate_html_report,
                 analysis_id=analysis_id,
                 url=url,
                 keywords=keywords,
-                issues=[SEOIssueResponse.model_validate(i) for i in issues],
-                metrics=SEOMetricResponse.model_validate(metrics) if metrics else None,
-                keyword_scores={k: KeywordScore(**v) for k, v in keyword_scores_dict.items()},
-                overall_score=analysis.overall_score,
-                technical_score=analysis.technical_score,
-                content_score=analysis.content_score,
-                page_title=analysis.page_title,
-                meta_description=analysis.meta_description,
+                # Built from values validated above, so no second validation pass
+                issues=[_construct_from_row(SEOIssueResponse, i) for i in issues],
+                metrics=_construct_from_row(SEOMetricResponse, metrics) if metrics else None,
+                keyword_scores={k: KeywordScore.model_construct(**v) for k, v in keyword_scores_dict.items()},
+                overall_score=scores['overall_score'],
+                technical_score=scores['technical_score'],
+                content_score=scores['content_score'],
+                page_title=crawl_result.page_title,
+                meta_description=crawl_result.meta_description,
                 detected_data=detected_data
             )
             
             # Generate PDF report
-            pdf_path = report_gen.generate_pdf_report(html_path, analysis_id)
-            
-            analysis.html_report_path = html_path
-            analysis.pdf_report_path = pdf_path
-            
-            # Save detected data to analysis metadata
-            analysis.analysis_metadata = {
-                'detected_data': detected_data
-            }
+            pdf_path = await asyncio.to_thread(report_gen.generate_pdf_report, html_path, analysis_id)
             
-            # Complete
-            analysis.status = SEOAnalysisStatus.COMPLETED
-            analysis.completed_at = datetime.now()
+            # Complete (detected data is kept in the analysis metadata)
+            await db.execute(
+                _update_analysis_stmt(analysis_id).values(
+                    html_report_path=html_path,
+                    pdf_report_path=pdf_path,
+                    analysis_metadata={'detected_data': detected_data},
+                    status=SEOAnalysisStatus.COMPLETED,
+                    completed_at=datetime.now()
+                )
+            )
             await db.commit()
+            _invalidate_analysis_cache(analysis_id)
             
             logger.info(f"[{analysis_id}] Analysis completed successfully!")
         
         except Exception as e:
             logger.error(f"[{analysis_id}] Analysis failed: {str(e)}", exc_info=True)
             
-            result = await db.execute(select(SEOAnalysis).where(SEOAnalysis.id == analysis_id))
-            analysis = result.scalar_one_or_none()
-            if analysis:
-                analysis.status = SEOAnalysisStatus.FAILED
-                analysis.error_message = str(e)
-                await db.commit()
+            # Discard the failed step's partial writes before recording the failure
+            await db.rollback()
+            await db.execute(
+                _update_analysis_stmt(analysis_id).values(
+                    status=SEOAnalysisStatus.FAILED,
+                    error_message=str(e)
+                )
+            )
+            await db.commit()
+            _invalidate_analysis_cache(analysis_id)
 
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from enum import Enum
@@ -77,6 +77,10 @@ class GeminiResponse(BaseModel):
     issues: List[GeminiIssue]
 
 
+class GeminiBatchResponse(BaseModel):
+    results: List[GeminiResponse]
+
+
 # API Request/Response Schemas
 class JobCreate(BaseModel):
     keywords: List[str]
@@ -94,8 +98,7 @@ class JobResponse(BaseModel):
     total_issues: int
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class FileResponse(BaseModel):
@@ -106,8 +109,7 @@ class FileResponse(BaseModel):
     size_bytes: int
     analyzed: bool
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class IssueResponse(BaseModel):
@@ -125,8 +127,7 @@ class IssueResponse(BaseModel):
     status: IssueStatus
     conflict_with: Optional[List[int]] = None
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class IssueApproval(BaseModel):
@@ -1,6 +1,7 @@
-from pydantic import BaseModel, Field, HttpUrl, field_validator
+from pydantic import BaseModel, ConfigDict, Field, HttpUrl, field_validator
 from typing import List, Optional, Dict, Any
 from datetime import datetime
+from dataclasses import dataclass
 from enum import Enum
 
 
@@ -83,8 +84,7 @@ class SEOIssueResponse(BaseModel):
     example_fix: Optional[str] = None
     context_data: Optional[Dict[str, Any]] = None
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class SEOMetricResponse(BaseModel):
@@ -110,8 +110,7 @@ class SEOMetricResponse(BaseModel):
     word_count: int
     keyword_density: Dict[str, float]
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class SEOAnalysisResponse(BaseModel):
@@ -146,8 +145,7 @@ class SEOAnalysisResponse(BaseModel):
     updated_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class SEOAnalysisDetailResponse(SEOAnalysisResponse):
@@ -183,7 +181,10 @@ class GeminiSEOResponse(BaseModel):
 
 
 # Internal Service Schemas
-class CrawlResult(BaseModel):
+# Built only by our own services, never from user input: plain slotted
+# dataclasses, so constructing them runs no validation
+@dataclass(slots=True)
+class CrawlResult:
     """Playwright crawl sonucu"""
     url: str
     html_content: str
@@ -196,7 +197,8 @@ class CrawlResult(BaseModel):
     visible_h1_count: Optional[int] = None  # Playwright ile sayılan görünür H1 sayısı
 
 
-class HTMLChunk(BaseModel):
+@dataclass(slots=True)
+class HTMLChunk:
     """HTML chunk for analysis"""
     chunk_id: int
     content: str
@@ -1,10 +1,34 @@
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 from pathlib import Path
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
 import logging
+import os
 import re
 
 logger = logging.getLogger(__name__)
 
+# chunk_directory uses a process pool from this many files up
+PARALLEL_CHUNK_MIN_FILES = 32
+
+# Characters str.splitlines() treats as line breaks ('\r\n' is two of them)
+LINE_BREAKS = frozenset('\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029')
+
+
+@dataclass(slots=True, frozen=True)
+class ChunkRecord:
+    """One chunk of a source file; lines are 1-indexed and inclusive"""
+    file_path: str
+    start_line: int
+    end_line: int
+    content: str
+    context_head: Optional[str]  # None for the first chunk
+    context_tail: Optional[str]  # None for the last chunk
+    line_count: int
+
 
 class Chunker:
     """
@@ -27,37 +51,54 @@ class Chunker:
         'style': (r'<style[^>]*>', r'</style>'),
     }
     
+    # Compiled once at class creation: (open_re, close_re) per block type
+    COMPILED_BLOCK_PATTERNS = {
+        name: (re.compile(open_pattern, re.IGNORECASE), re.compile(close_pattern, re.IGNORECASE))
+        for name, (open_pattern, close_pattern) in BLOCK_PATTERNS.items()
+    }
+    
+    # Closing tags are searched at most this many lines after the opening tag
+    MAX_BLOCK_SEARCH_LINES = 100
+    
     def __init__(self, chunk_size: int = 180, overlap: int = 20, context_lines: int = 10):
         self.chunk_size = chunk_size
         self.overlap = overlap
         self.context_lines = context_lines
     
-    def chunk_file(self, file_path: str, content: str = None) -> List[dict]:
+    def chunk_file(self, file_path: str, content: str = None) -> List[ChunkRecord]:
         """
         Chunk a file into overlapping segments
         
-        Returns list of chunks with structure:
-        {
-            'file_path': str,
-            'start_line': int,
-            'end_line': int,
-            'content': str,
-            'context_head': str,
-            'context_tail': str
-        }
+        Returns list of ChunkRecord
         """
         # Read file if content not provided
         if content is None:
             with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
                 content = f.read()
         
-        lines = content.splitlines()
-        total_lines = len(lines)
+        line_starts = self._line_starts(content)
+        total_lines = len(line_starts) - 1
         
         if total_lines == 0:
             logger.warning(f"Empty file: {file_path}")
             return []
         
+        # Chunks are sliced from the content by offset, which needs '\n' line
+        # breaks; other splitlines() boundaries (\r\n, \r, \f, ...) are rewritten
+        # once. The count check misses a file that ends in such a boundary.
+        last_char = content[-1]
+        if (
+            '\r' in content
+            or (last_char != '\n' and last_char in LINE_BREAKS)
+            or content.count('\n') != total_lines - (last_char != '\n')
+        ):
+            content = '\n'.join(content.splitlines()) + '\n'
+            line_starts = self._line_starts(content)
+        
+        # Semantic blocks are located once per file, not once per chunk
+        block_spans = self._find_block_spans(content, line_starts, total_lines)
+        block_opens = [span[0] for span in block_spans]
+        
         chunks = []
         start = 0
         
@@ -66,31 +107,28 @@ class Chunker:
             end = min(start + self.chunk_size, total_lines)
             
             # SEMANTIC EXPANSION: Check if we're splitting a structured block
-            end = self._expand_for_semantic_blocks(lines, start, end, total_lines)
+            end = self._expand_for_semantic_blocks(block_spans, block_opens, start, end, total_lines)
             
             # Extract chunk content
-            chunk_lines = lines[start:end]
-            chunk_content = '\n'.join(chunk_lines)
+            chunk_content = self._slice_lines(content, line_starts, start, end)
             
             # Extract context (previous 10 lines)
             context_head_start = max(0, start - self.context_lines)
-            context_head_lines = lines[context_head_start:start]
-            context_head = '\n'.join(context_head_lines) if context_head_lines else None
+            context_head = self._slice_lines(content, line_starts, context_head_start, start)
             
             # Extract context (next 10 lines)
             context_tail_end = min(total_lines, end + self.context_lines)
-            context_tail_lines = lines[end:context_tail_end]
-            context_tail = '\n'.join(context_tail_lines) if context_tail_lines else None
+            context_tail = self._slice_lines(content, line_starts, end, context_tail_end)
             
-            chunk = {
-                'file_path': file_path,
-                'start_line': start + 1,  # 1-indexed for human readability
-                'end_line': end,
-                'content': chunk_content,
-                'context_head': context_head,
-                'context_tail': context_tail,
-                'line_count': len(chunk_lines)
-            }
+            chunk = ChunkRecord(
+                file_path=file_path,
+                start_line=start + 1,  # 1-indexed for human readability
+                end_line=end,
+                content=chunk_content,
+                context_head=context_head,
+                context_tail=context_tail,
+                line_count=end - start
+            )
             
             chunks.append(chunk)
             
@@ -104,79 +142,113 @@ class Chunker:
         logger.info(f"Created {len(chunks)} chunks for {file_path} ({total_lines} lines)")
         return chunks
     
-    def _expand_for_semantic_blocks(
+    def _line_starts(self, content: str) -> List[int]:
+        """
+        Character offset of the start of every line (str.splitlines boundaries)
+        
+        Has total_lines + 1 entries; the last one is len(content).
+        """
+        return [0, *accumulate(map(len, content.splitlines(keepends=True)))]
+    
+    def _slice_lines(self, content: str, line_starts: List[int], first: int, last: int) -> Optional[str]:
+        """
+        Text of lines [first, last) without the final line break, or None if empty
+        """
+        if first >= last:
+            return None
+        
+        stop = line_starts[last]
+        if content[stop - 1] == '\n':
+            stop -= 1
+        return content[line_starts[first]:stop]
+    
+    def _find_block_spans(
         self,
-        lines: List[str],
-        start: int,
-        end: int,
+        content: str,
+        line_starts: List[int],
         total_lines: int
-    ) -> int:
+    ) -> List[Tuple[int, int, str]]:
         """
-        Expand chunk boundaries if they split semantic blocks
+        Locate semantic blocks in the whole file
         
         Checks for:
         - <script> blocks (including JSON-LD)
         - <head> blocks
         - <style> blocks
         
-        Returns adjusted end line
+        Returns (open_line, close_line, block_name) tuples (0-indexed lines)
+        sorted by open_line; blocks without a closing tag within
+        MAX_BLOCK_SEARCH_LINES are skipped
         """
-        chunk_content = '\n'.join(lines[start:end])
+        spans = []
+        # Lines holding a closing tag, per close pattern (script and JSON-LD share one)
+        close_lines_by_pattern = {}
         
-        # Check each block type
-        for block_name, (open_pattern, close_pattern) in self.BLOCK_PATTERNS.items():
-            # Find all opening tags in chunk
-            open_matches = list(re.finditer(open_pattern, chunk_content, re.IGNORECASE))
+        for block_name, (open_re, close_re) in self.COMPILED_BLOCK_PATTERNS.items():
+            close_lines = close_lines_by_pattern.get(close_re.pattern)
+            if close_lines is None:
+                close_lines = [
+                    bisect_right(line_starts, close_match.start()) - 1
+                    for close_match in close_re.finditer(content)
+                ]
+                close_lines_by_pattern[close_re.pattern] = close_lines
             
-            for open_match in open_matches:
-                # Calculate absolute line number of opening tag
-                lines_before_match = chunk_content[:open_match.start()].count('\n')
-                open_line = start + lines_before_match
-                
-                # Search for closing tag from open_line onwards
-                close_line = self._find_closing_tag(
-                    lines,
-                    open_line,
-                    close_pattern,
-                    total_lines
-                )
+            if not close_lines:
+                continue
+            
+            for open_match in open_re.finditer(content):
+                open_line = bisect_right(line_starts, open_match.start()) - 1
                 
-                if close_line is not None and close_line >= end:
-                    # Block extends beyond current chunk - expand
-                    new_end = close_line + 1
-                    logger.debug(
-                        f"Semantic expansion: {block_name} block "
-                        f"[{open_line}:{close_line}] extends chunk to line {new_end}"
-                    )
-                    end = min(new_end, total_lines)
-        
-        return end
+                # First closing tag from the opening tag's line onwards
+                index = bisect_left(close_lines, open_line)
+                if index < len(close_lines) and close_lines[index] < open_line + self.MAX_BLOCK_SEARCH_LINES:
+                    spans.append((open_line, close_lines[index], block_name))
+        
+        spans.sort()
+        return spans
     
-    def _find_closing_tag(
+    def _expand_for_semantic_blocks(
         self,
-        lines: List[str],
-        start_line: int,
-        close_pattern: str,
-        total_lines: int,
-        max_search: int = 100
+        block_spans: List[Tuple[int, int, str]],
+        block_opens: List[int],
+        start: int,
+        end: int,
+        total_lines: int
     ) -> int:
         """
-        Find closing tag starting from start_line
+        Expand chunk boundaries if they split semantic blocks
         
-        Returns line number of closing tag, or None if not found
+        Blocks opening inside [start, end) are found by bisecting the
+        precomputed spans. Returns adjusted end line
         """
-        search_end = min(start_line + max_search, total_lines)
+        new_end = end
         
-        for i in range(start_line, search_end):
-            if re.search(close_pattern, lines[i], re.IGNORECASE):
-                return i
+        for open_line, close_line, block_name in block_spans[
+            bisect_left(block_opens, start):bisect_left(block_opens, end)
+        ]:
+            if close_line >= new_end:
+                # Block extends beyond current chunk - expand
+                new_end = close_line + 1
+                logger.debug(
+                    f"Semantic expansion: {block_name} block "
+                    f"[{open_line}:{close_line}] extends chunk to line {new_end}"
+                )
         
-        return None
+        return min(new_end, total_lines)
     
-    def chunk_directory(self, directory: str, extensions: List[str] = None) -> dict:
+    def chunk_directory(
+        self,
+        directory: str,
+        extensions: List[str] = None,
+        inventory: Optional[List[Dict]] = None
+    ) -> dict:
         """
         Chunk all files in a directory
         
+        If an inventory from FileHandler.create_inventory is given, its files
+        are chunked instead of walking the directory, and any 'content' it
+        carries is used instead of reading the file again.
+        
         Returns dict: {file_path: [chunks]}
         """
         if extensions is None:
@@ -185,15 +257,33 @@ class Chunker:
         directory_path = Path(directory)
         all_chunks = {}
         
-        for ext in extensions:
-            for file_path in directory_path.rglob(f'*{ext}'):
-                if file_path.is_file():
-                    try:
-                        chunks = self.chunk_file(str(file_path))
-                        if chunks:
-                            all_chunks[str(file_path)] = chunks
-                    except Exception as e:
-                        logger.error(f"Failed to chunk {file_path}: {e}")
+        extensions = set(extensions)
+        if inventory is not None:
+            tasks = [
+                (file_info['absolute_path'], file_info.get('content'),
+                 self.chunk_size, self.overlap, self.context_lines)
+                for file_info in inventory
+                if file_info['file_type'] in extensions
+            ]
+        else:
+            # Single walk over the tree, filtering by extension
+            tasks = [
+                (str(file_path), None, self.chunk_size, self.overlap, self.context_lines)
+                for file_path in directory_path.rglob('*')
+                if file_path.suffix in extensions and file_path.is_file()
+            ]
+        
+        # Chunking is CPU-bound (regex scans hold the GIL): spread files over
+        # processes, unless there are too few to cover the pool startup cost
+        if len(tasks) < PARALLEL_CHUNK_MIN_FILES:
+            results = map(_chunk_file_worker, tasks)
+        else:
+            with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+                results = list(executor.map(_chunk_file_worker, tasks, chunksize=16))
+        
+        for file_path, chunks in results:
+            if chunks:
+                all_chunks[file_path] = chunks
         
         total_chunks = sum(len(chunks) for chunks in all_chunks.values())
         logger.info(f"Chunked {len(all_chunks)} files into {total_chunks} total chunks")
@@ -206,24 +296,53 @@ class Chunker:
         Useful for displaying issues in UI
         """
         try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                lines = f.readlines()
+            stat = os.stat(file_path)
+            lines = _read_lines_cached(file_path, stat.st_mtime_ns, stat.st_size)
             
             start = max(0, line_number - context - 1)
             end = min(len(lines), line_number + context)
             
-            context_lines = []
-            for i in range(start, end):
-                prefix = ">>> " if i == line_number - 1 else "    "
-                context_lines.append(f"{prefix}{i+1:4d} | {lines[i].rstrip()}")
-            
-            return '\n'.join(context_lines)
+            target = line_number - 1
+            return '\n'.join([
+                ('>>> %4d | %s' if i == target else '    %4d | %s') % (i + 1, lines[i].rstrip())
+                for i in range(start, end)
+            ])
         
         except Exception as e:
             logger.error(f"Failed to get line content: {e}")
             return ""
 
 
+@lru_cache(maxsize=64)
+def _read_lines_cached(file_path: str, mtime_ns: int, size: int) -> Tuple[str, ...]:
+    """
+    Read a file's lines for get_line_content
+    
+    mtime and size are part of the cache key, so an edited file (e.g. after
+    a patch is applied) is read again instead of served stale.
+    """
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        return tuple(f.readlines())
+
+
+def _chunk_file_worker(
+    task: Tuple[str, Optional[str], int, int, int]
+) -> Tuple[str, List[ChunkRecord]]:
+    """
+    Chunk one file; module-level so it can run in a process pool
+    
+    task is (file_path, content, chunk_size, overlap, context_lines); the
+    file is read only when content is None
+    """
+    file_path, content, chunk_size, overlap, context_lines = task
+    try:
+        chunker = Chunker(chunk_size, overlap, context_lines)
+        return file_path, chunker.chunk_file(file_path, content)
+    except Exception as e:
+        logger.error(f"Failed to chunk {file_path}: {e}")
+        return file_path, []
+
+
 # Singleton instance
 chunker = Chunker(chunk_size=180, overlap=20, context_lines=10)
 
@@ -1,5 +1,5 @@
-from collections import defaultdict
-from typing import Dict
+from collections import OrderedDict
+from typing import Set
 import logging
 
 logger = logging.getLogger(__name__)
@@ -17,10 +17,13 @@ class CircuitBreaker:
     
     FAILURE_THRESHOLD = 5
     
+    # Jobs tracked at once; the least recently updated job is forgotten first
+    MAX_TRACKED_JOBS = 10_000
+    
     def __init__(self):
-        # Track failures per job
-        self.failures: Dict[str, int] = defaultdict(int)
-        self.tripped: Dict[str, bool] = defaultdict(bool)
+        # Track failures per job; plain containers so lookups never add keys
+        self.failures: OrderedDict[str, int] = OrderedDict()
+        self.tripped: Set[str] = set()
         
         logger.info(f"CircuitBreaker initialized: threshold={self.FAILURE_THRESHOLD}")
     
@@ -30,36 +33,47 @@ class CircuitBreaker:
         
         Returns: True if circuit breaker tripped (should stop)
         """
-        self.failures[job_id] += 1
+        count = self.failures.get(job_id, 0) + 1
+        self._set_failures(job_id, count)
         
-        if self.failures[job_id] >= self.FAILURE_THRESHOLD:
-            if not self.tripped[job_id]:
-                self.tripped[job_id] = True
+        if count >= self.FAILURE_THRESHOLD:
+            if job_id not in self.tripped:
+                self.tripped.add(job_id)
                 logger.error(
                     f"🔴 CIRCUIT BREAKER TRIPPED for job {job_id}: "
-                    f"{self.failures[job_id]} failures. "
+                    f"{count} failures. "
                     f"Auto-stopping further patches."
                 )
             return True
         
         logger.warning(
             f"Failure recorded for job {job_id}: "
-            f"{self.failures[job_id]}/{self.FAILURE_THRESHOLD}"
+            f"{count}/{self.FAILURE_THRESHOLD}"
         )
         return False
     
     def record_success(self, job_id: str):
         """Record a successful patch (resets failure count)"""
-        if self.failures[job_id] > 0:
+        count = self.failures.get(job_id, 0)
+        if count > 0:
             logger.info(
                 f"Success recorded for job {job_id}, "
-                f"resetting failure count from {self.failures[job_id]}"
+                f"resetting failure count from {count}"
             )
-            self.failures[job_id] = 0
+            self._set_failures(job_id, 0)
+    
+    def _set_failures(self, job_id: str, count: int):
+        """Store a failure count, evicting the least recently updated jobs past MAX_TRACKED_JOBS"""
+        self.failures[job_id] = count
+        self.failures.move_to_end(job_id)
+        
+        while len(self.failures) > self.MAX_TRACKED_JOBS:
+            evicted, _ = self.failures.popitem(last=False)
+            self.tripped.discard(evicted)
     
     def is_tripped(self, job_id: str) -> bool:
         """Check if circuit breaker is tripped for a job"""
-        return self.tripped.get(job_id, False)
+        return job_id in self.tripped
     
     def get_failure_count(self, job_id: str) -> int:
         """Get current failure count for a job"""
@@ -67,19 +81,29 @@ class CircuitBreaker:
     
     def reset(self, job_id: str):
         """Reset circuit breaker for a job"""
-        self.failures[job_id] = 0
-        self.tripped[job_id] = False
+        self.failures.pop(job_id, None)
+        self.tripped.discard(job_id)
         logger.info(f"Circuit breaker reset for job {job_id}")
     
     def get_status(self, job_id: str) -> dict:
         """Get circuit breaker status for a job"""
+        failures = self.failures.get(job_id, 0)
         return {
             "job_id": job_id,
-            "failures": self.failures.get(job_id, 0),
+            "failures": failures,
             "threshold": self.FAILURE_THRESHOLD,
-            "tripped": self.tripped.get(job_id, False),
-            "remaining_attempts": max(0, self.FAILURE_THRESHOLD - self.failures.get(job_id, 0))
+            "tripped": job_id in self.tripped,
+            "remaining_attempts": max(0, self.FAILURE_THRESHOLD - failures)
         }
+    
+    def get_all_statuses(self) -> list:
+        """
+        Get circuit breaker status for every tracked job
+        
+        Iterates a snapshot of the job ids; all access happens on the event
+        loop thread, so no lock is needed.
+        """
+        return [self.get_status(job_id) for job_id in list(self.failures)]
 
 
 # Global singleton instance
@@ -1,9 +1,13 @@
 from typing import List, Dict
 from collections import defaultdict
+from operator import itemgetter
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Sort key for (severity_rank, issue) pairs
+_by_rank = itemgetter(0)
+
 
 class IssueDeduplicator:
     """
@@ -23,6 +27,8 @@ class IssueDeduplicator:
         'low': 1
     }
     
+    _line_key = itemgetter('file_path', 'line_number')
+    
     @staticmethod
     def deduplicate_issues(issues: List[Dict]) -> List[Dict]:
         """
@@ -30,13 +36,17 @@ class IssueDeduplicator:
         
         Returns list of issues with updated status
         """
-        # Group issues by file and line
+        # Group issues by file and line; keys are extracted in C by itemgetter
         grouped = defaultdict(list)
-        for issue in issues:
-            key = (issue['file_path'], issue['line_number'])
+        for key, issue in zip(map(IssueDeduplicator._line_key, issues), issues):
             grouped[key].append(issue)
         
+        # No line has more than one issue: nothing to resolve
+        if len(grouped) == len(issues):
+            return list(issues)
+        
         deduplicated = []
+        severity_order = IssueDeduplicator.SEVERITY_ORDER
         
         for (file_path, line_number), line_issues in grouped.items():
             if len(line_issues) == 1:
@@ -68,14 +78,14 @@ class IssueDeduplicator:
                 )
             else:
                 # No conflict - keep highest severity
-                sorted_issues = sorted(
-                    line_issues,
-                    key=lambda x: IssueDeduplicator.SEVERITY_ORDER.get(
-                        x['severity'].value if hasattr(x['severity'], 'value') else x['severity'],
-                        0
-                    ),
+                # IssueSeverity is a str enum, so members and plain strings
+                # look up the same SEVERITY_ORDER entry without .value
+                ranked = sorted(
+                    ((severity_order.get(issue['severity'], 0), issue) for issue in line_issues),
+                    key=_by_rank,
                     reverse=True
                 )
+                sorted_issues = [issue for _, issue in ranked]
                 
                 # Keep highest severity
                 highest = sorted_issues[0]
@@ -101,25 +111,14 @@ class IssueDeduplicator:
         
         Conflict = multiple issues want to modify the same line with different actions
         """
-        actions = set()
-        codes = set()
-        
-        for issue in issues:
-            action = issue['action']
-            
-            # Only replace_line can conflict with other replace_line
-            if action == 'replace_line':
-                actions.add(action)
-                codes.add(issue['code'])
-        
-        # Conflict if multiple replace_line with different code
-        if 'replace_line' in actions and len(codes) > 1:
-            return True
-        
-        # insert_after_line can coexist (multiple insertions)
-        # annotate can coexist (multiple comments)
+        # Only replace_line can conflict with other replace_line;
+        # insert_after_line and annotate can coexist
+        replacements = (issue['code'] for issue in issues if issue['action'] == 'replace_line')
+        first_code = next(replacements, None)
         
-        return False
+        # Conflict if multiple replace_line with different code; stops at
+        # the first code that differs
+        return any(code != first_code for code in replacements)
     
     @staticmethod
     def get_conflict_summary(issues: List[Dict]) -> Dict:
@@ -2,14 +2,46 @@ import zipfile
 import tarfile
 import shutil
 from pathlib import Path
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict, Optional
 import logging
 import magic
 import aiofiles
 import os
+import resource
+import signal
+import subprocess
+import threading
 
 logger = logging.getLogger(__name__)
 
+# Read size when streaming uploads to disk
+UPLOAD_READ_SIZE = 1 << 20  # 1MB
+
+# Block size when counting newlines in larger files
+LINE_COUNT_READ_SIZE = 1 << 20  # 1MB
+
+# create_inventory(include_content=True) keeps decoded text up to this size
+INVENTORY_CONTENT_MAX_SIZE = 2 * 1024 * 1024  # 2MB
+
+# libmagic handle shared by get_file_type; loading the magic database is
+# expensive and the handle is not thread-safe, so it is created once and
+# used under a lock
+_mime_detector = None
+_mime_lock = threading.Lock()
+
+# libarchive's bsdtar extracts zip and tar much faster than zipfile/tarfile
+BSDTAR_PATH = shutil.which("bsdtar")
+
+
+class UploadTooLargeError(Exception):
+    """Raised when a streamed upload exceeds the size limit"""
+    pass
+
+
+class ExtractionTooLargeError(Exception):
+    """Raised when archive members add up past the extraction size limit"""
+    pass
+
 
 class FileHandler:
     """
@@ -18,46 +50,113 @@ class FileHandler:
     
     SUPPORTED_EXTENSIONS = ['.php', '.html', '.htm', '.js', '.jsx', '.tsx', '.ts', '.css']
     
+    # Directories never inventoried (hidden directories are skipped too)
+    SKIPPED_DIRS = frozenset({'__MACOSX', 'node_modules', '__pycache__'})
+    
     def __init__(self, workspace_dir: str):
         self.workspace_dir = Path(workspace_dir)
         self.workspace_dir.mkdir(parents=True, exist_ok=True)
     
-    async def save_upload(self, file_content: bytes, filename: str, job_id: str) -> str:
+    async def save_upload(
+        self,
+        chunks: AsyncIterator[bytes],
+        filename: str,
+        job_id: str,
+        max_size: Optional[int] = None
+    ) -> str:
         """
-        Save uploaded file to workspace
+        Stream uploaded chunks to the workspace without holding the whole
+        file in memory
+        
+        Raises UploadTooLargeError (and removes the partial file) once more
+        than max_size bytes have been received.
         Returns: path to saved file
         """
         job_dir = self.workspace_dir / job_id
         job_dir.mkdir(parents=True, exist_ok=True)
         
         upload_path = job_dir / filename
+        total = 0
         
-        async with aiofiles.open(upload_path, 'wb') as f:
-            await f.write(file_content)
+        try:
+            async with aiofiles.open(upload_path, 'wb') as f:
+                async for chunk in chunks:
+                    total += len(chunk)
+                    if max_size is not None and total > max_size:
+                        raise UploadTooLargeError(
+                            f"Upload exceeds limit of {max_size} bytes"
+                        )
+                    await f.write(chunk)
+        except BaseException:
+            upload_path.unlink(missing_ok=True)
+            raise
         
-        logger.info(f"Saved upload: {upload_path} ({len(file_content)} bytes)")
+        logger.info(f"Saved upload: {upload_path} ({total} bytes)")
         return str(upload_path)
     
-    def extract_archive(self, archive_path: str, job_id: str) -> str:
+    async def save_upload_stream(self, upload, filename: str, job_id: str, max_size: int) -> str:
+        """
+        Stream an upload (anything with async read(size), e.g. UploadFile)
+        to the workspace, UPLOAD_READ_SIZE bytes at a time
+        
+        Returns: path to saved file
+        """
+        async def read_chunks() -> AsyncIterator[bytes]:
+            while chunk := await upload.read(UPLOAD_READ_SIZE):
+                yield chunk
+        
+        return await self.save_upload(read_chunks(), filename, job_id, max_size)
+    
+    def peek_uncompressed_size(self, archive_path: str) -> int:
+        """
+        Sum the declared uncompressed size of all archive members
+        
+        Reads the ZIP central directory or the TAR member headers only,
+        nothing is written to disk.
+        """
+        archive_path = Path(archive_path)
+        
+        if zipfile.is_zipfile(archive_path):
+            with zipfile.ZipFile(archive_path, 'r') as zip_ref:
+                return sum(info.file_size for info in zip_ref.infolist())
+        
+        if tarfile.is_tarfile(archive_path):
+            with tarfile.open(archive_path, 'r:*') as tar_ref:
+                return sum(member.size for member in tar_ref if member.isfile())
+        
+        raise ValueError("Unsupported archive format")
+    
+    def extract_archive(self, archive_path: str, job_id: str, max_size: Optional[int] = None) -> str:
         """
         Extract ZIP or TAR archive
+        
+        Blocking; async callers run it with asyncio.to_thread. Members
+        escaping the extraction directory are skipped. With max_size set,
+        ExtractionTooLargeError is raised once the extracted members exceed
+        max_size bytes, and the extraction directory is removed.
         Returns: path to extraction directory
         """
         archive_path = Path(archive_path)
         extract_dir = self.workspace_dir / job_id / "extracted"
         extract_dir.mkdir(parents=True, exist_ok=True)
         
+        use_bsdtar = BSDTAR_PATH is not None
+        
         try:
             # Detect archive type
             if zipfile.is_zipfile(archive_path):
                 logger.info(f"Extracting ZIP: {archive_path}")
-                with zipfile.ZipFile(archive_path, 'r') as zip_ref:
-                    zip_ref.extractall(extract_dir)
+                if use_bsdtar:
+                    self._extract_with_bsdtar(archive_path, extract_dir, max_size)
+                else:
+                    self._extract_zip(archive_path, extract_dir, max_size)
             
             elif tarfile.is_tarfile(archive_path):
                 logger.info(f"Extracting TAR: {archive_path}")
-                with tarfile.open(archive_path, 'r:*') as tar_ref:
-                    tar_ref.extractall(extract_dir)
+                if use_bsdtar:
+                    self._extract_with_bsdtar(archive_path, extract_dir, max_size)
+                else:
+                    self._extract_tar(archive_path, extract_dir, max_size)
             
             else:
                 raise ValueError("Unsupported archive format")
@@ -65,14 +164,101 @@ class FileHandler:
             logger.info(f"Extracted to: {extract_dir}")
             return str(extract_dir)
         
+        except ExtractionTooLargeError as e:
+            logger.error(f"Failed to extract archive: {e}")
+            shutil.rmtree(extract_dir, ignore_errors=True)
+            raise
+        
         except Exception as e:
             logger.error(f"Failed to extract archive: {e}")
             raise
     
-    def create_inventory(self, directory: str) -> List[Dict]:
+    def _extract_with_bsdtar(self, archive_path: Path, extract_dir: Path, max_size: Optional[int] = None):
+        """
+        Extract with bsdtar (zip and tar, any compression)
+        
+        bsdtar refuses absolute paths and '..' entries by default. It cannot
+        cap the total it writes, so with max_size set the declared sizes are
+        checked first, bsdtar runs under a file-size rlimit of max_size (a
+        member with a lying header cannot grow past it) and the written
+        total is measured afterwards.
+        """
+        too_large = ExtractionTooLargeError(f"Archive expands past limit of {max_size} bytes")
+        
+        if max_size is not None and self.peek_uncompressed_size(archive_path) > max_size:
+            raise too_large
+        
+        result = subprocess.run(
+            [BSDTAR_PATH, '-xf', str(archive_path), '-C', str(extract_dir)],
+            capture_output=True,
+            text=True,
+            preexec_fn=None if max_size is None else lambda: _limit_file_size(max_size)
+        )
+        
+        if max_size is not None and (
+            result.returncode == -signal.SIGXFSZ or 'File too large' in result.stderr
+        ):
+            raise too_large
+        
+        if result.returncode != 0:
+            raise RuntimeError(f"bsdtar failed: {result.stderr.strip()}")
+        
+        if max_size is not None and _directory_size(extract_dir) > max_size:
+            raise too_large
+    
+    def _extract_zip(self, archive_path: Path, extract_dir: Path, max_size: Optional[int] = None):
+        """Extract a ZIP member by member, addressing entries by ZipInfo"""
+        root = extract_dir.resolve()
+        total = 0
+        
+        with zipfile.ZipFile(archive_path, 'r') as zip_ref:
+            for info in zip_ref.infolist():
+                if not (root / info.filename).resolve().is_relative_to(root):
+                    logger.warning(f"Skipping ZIP entry outside extraction dir: {info.filename}")
+                    continue
+                
+                # zipfile stops reading a member at its declared file_size
+                total += info.file_size
+                if max_size is not None and total > max_size:
+                    raise ExtractionTooLargeError(
+                        f"Archive expands past limit of {max_size} bytes"
+                    )
+                
+                zip_ref.extract(info, extract_dir)
+    
+    def _extract_tar(self, archive_path: Path, extract_dir: Path, max_size: Optional[int] = None):
+        """
+        Extract a TAR in a single streaming pass over its TarInfo members
+        
+        Members are never looked up by name, which would scan the whole
+        member list for every file. The 'data' filter rejects absolute
+        paths, '..' entries, links pointing outside extract_dir and device
+        files; rejected members are skipped.
+        """
+        total = 0
+        
+        with tarfile.open(archive_path, 'r:*') as tar_ref:
+            for member in tar_ref:
+                if member.isfile():
+                    total += member.size
+                    if max_size is not None and total > max_size:
+                        raise ExtractionTooLargeError(
+                            f"Archive expands past limit of {max_size} bytes"
+                        )
+                
+                try:
+                    tar_ref.extract(member, extract_dir, filter='data')
+                except tarfile.FilterError as e:
+                    logger.warning(f"Skipping TAR entry {member.name}: {e}")
+    
+    def create_inventory(self, directory: str, include_content: bool = False) -> List[Dict]:
         """
         Create inventory of all supported files in directory
         
+        With include_content, files up to INVENTORY_CONTENT_MAX_SIZE also
+        carry their decoded text under 'content', so chunking can reuse it
+        instead of reading the file again.
+        
         Returns list of file info:
         [
             {
@@ -86,49 +272,102 @@ class FileHandler:
         directory = Path(directory)
         inventory = []
         
-        for ext in self.SUPPORTED_EXTENSIONS:
-            for file_path in directory.rglob(f'*{ext}'):
-                # Skip __MACOSX and hidden files
-                if '__MACOSX' in str(file_path) or any(part.startswith('.') for part in file_path.parts):
-                    continue
-                    
-                if file_path.is_file():
-                    try:
-                        # Get file info
-                        size_bytes = file_path.stat().st_size
-                        
-                        # Count lines
-                        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                            line_count = sum(1 for _ in f)
-                        
-                        # Get relative path from extraction directory
-                        relative_path = file_path.relative_to(directory)
-                        
-                        file_info = {
-                            'file_path': str(relative_path),
-                            'absolute_path': str(file_path),
-                            'file_type': ext,
-                            'size_bytes': size_bytes,
-                            'line_count': line_count
-                        }
-                        
-                        inventory.append(file_info)
-                        logger.debug(f"Inventoried: {relative_path} ({line_count} lines)")
-                    
-                    except Exception as e:
-                        logger.warning(f"Failed to inventory {file_path}: {e}")
+        # One directory walk for all extensions; DirEntry caches the stat result
+        for entry, ext in self._iter_supported_files(directory):
+            file_path = Path(entry.path)
+            
+            try:
+                # Get file info
+                size_bytes = entry.stat().st_size
+                
+                content = None
+                if include_content and size_bytes <= INVENTORY_CONTENT_MAX_SIZE:
+                    # One read serves both the line count and the chunker
+                    with open(file_path, 'rb') as f:
+                        data = f.read()
+                    line_count = data.count(b'\n') + (bool(data) and not data.endswith(b'\n'))
+                    content = data.decode('utf-8', errors='ignore')
+                else:
+                    line_count = self._count_lines(file_path, size_bytes)
+                
+                # Get relative path from extraction directory
+                relative_path = file_path.relative_to(directory)
+                
+                file_info = {
+                    'file_path': str(relative_path),
+                    'absolute_path': str(file_path),
+                    'file_type': ext,
+                    'size_bytes': size_bytes,
+                    'line_count': line_count
+                }
+                if content is not None:
+                    file_info['content'] = content
+                
+                inventory.append(file_info)
+                logger.debug(f"Inventoried: {relative_path} ({line_count} lines)")
+            
+            except Exception as e:
+                logger.warning(f"Failed to inventory {file_path}: {e}")
         
         logger.info(f"Created inventory: {len(inventory)} files")
         return inventory
     
+    def _count_lines(self, file_path: Path, size_bytes: int) -> int:
+        """
+        Count lines by counting b'\\n' bytes, without decoding the file
+
+        A final line without a trailing newline still counts as a line.
+        """
+        if size_bytes == 0:
+            return 0
+        
+        line_count = 0
+        block = b''
+        with open(file_path, 'rb') as f:
+            while data := f.read(LINE_COUNT_READ_SIZE):
+                line_count += data.count(b'\n')
+                block = data
+        
+        return line_count + (not block.endswith(b'\n'))
+    
+    def _iter_supported_files(self, directory: Path):
+        """
+        Walk directory once with os.scandir, yielding (DirEntry, extension)
+        for files with a supported extension
+        
+        Hidden entries and SKIPPED_DIRS are pruned, so their subtrees are
+        never scanned. Symlinked directories are not descended into (same
+        as Path.rglob).
+        """
+        extensions = set(self.SUPPORTED_EXTENSIONS)
+        stack = [str(directory)]
+        
+        while stack:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue
+                    
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in self.SKIPPED_DIRS:
+                            stack.append(entry.path)
+                        continue
+                    
+                    ext = os.path.splitext(entry.name)[1]
+                    if ext in extensions and entry.is_file():
+                        yield entry, ext
+    
     def get_file_type(self, file_path: str) -> str:
         """
         Detect file type using python-magic
         """
+        global _mime_detector
+        
         try:
-            mime = magic.Magic(mime=True)
-            file_type = mime.from_file(file_path)
-            return file_type
+            with _mime_lock:
+                if _mime_detector is None:
+                    _mime_detector = magic.Magic(mime=True)
+                return _mime_detector.from_file(file_path)
         except Exception as e:
             logger.warning(f"Failed to detect file type: {e}")
             return Path(file_path).suffix
@@ -143,5 +382,26 @@ class FileHandler:
             logger.info(f"Cleaned up job: {job_id}")
 
 
+def _limit_file_size(max_size: int):
+    """Cap the size of any file the current process writes (bsdtar child)"""
+    resource.setrlimit(resource.RLIMIT_FSIZE, (max_size, max_size))
+
+
+def _directory_size(directory: Path) -> int:
+    """Total size of the regular files under directory; symlinks are not followed"""
+    total = 0
+    stack = [directory]
+    
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    total += entry.stat(follow_symlinks=False).st_size
+    
+    return total
+
+
 # Singleton instance will be created in main.py with config
 
@@ -1,9 +1,17 @@
 import google.generativeai as genai
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from google.api_core import exceptions as google_exceptions
+from tenacity import (
+    retry, stop_after_attempt, wait_random_exponential,
+    retry_if_exception_type, retry_if_not_exception_type
+)
 from app.config import get_settings
-from app.schemas import GeminiPromptData, GeminiResponse
+from app.schemas import GeminiPromptData, GeminiResponse, GeminiBatchResponse, GlobalRules
 from app.services.rate_limiter import rate_limiter
-import json
+from app.services.response_cache import ResponseCache
+from pydantic import ValidationError
+from typing import List, Optional
+import hashlib
+import orjson
 import logging
 import asyncio
 
@@ -102,6 +110,47 @@ Here is the analysis: {...}
 
 SADECE JSON DÖNDÜR!"""
 
+# Per-attempt timeout for a Gemini call (the SDK default is 60s)
+GEMINI_CALL_TIMEOUT = 180.0  # seconds
+
+# Failures worth another attempt: rate limits, transient server errors,
+# timeouts and unparseable answers. Schema validation errors are not
+# retried (pydantic's ValidationError is itself a ValueError).
+_RETRYABLE_ERRORS = (
+    ValueError,
+    ConnectionError,
+    asyncio.TimeoutError,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+)
+_RETRY_IF = retry_if_exception_type(_RETRYABLE_ERRORS) & retry_if_not_exception_type(ValidationError)
+
+# Static head of every analyze_chunk prompt, built once. Everything that
+# varies per chunk comes after it, so consecutive requests share this
+# prefix byte for byte.
+CHUNK_PROMPT_PREFIX = f"{SYSTEM_PROMPT}\n\nAnalyze this code chunk and return ONLY valid JSON:\n\n"
+CHUNK_PROMPT_SUFFIX = "\n\nRemember: Return ONLY the JSON object, no markdown, no explanations."
+
+# Batched variant: the job-level fields are sent once and each entry of
+# "batch" gets its own object in "results", in the same order
+BATCH_PROMPT_PREFIX = (
+    f"{SYSTEM_PROMPT}\n\nAnalyze each code chunk in \"batch\" separately. "
+    "Return ONLY valid JSON of the form {\"results\": [...]}, with one object "
+    "in the output format above per chunk, in the same order as \"batch\":\n\n"
+)
+BATCH_PROMPT_SUFFIX = "\n\nRemember: Return ONLY the {\"results\": [...]} object, no markdown, no explanations."
+
+
+def _dump_prompt_json(data: dict) -> str:
+    """
+    Serialize prompt data as 2-space indented JSON with orjson
+    
+    Same bytes as json.dumps(data, ensure_ascii=False, indent=2).
+    """
+    return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode()
+
 
 class GeminiClient:
     def __init__(self):
@@ -112,10 +161,64 @@ class GeminiClient:
                 "max_output_tokens": settings.GEMINI_MAX_OUTPUT_TOKENS,
             }
         )
+        
+        # Answers keyed by prompt hash: re-analyzing an unchanged chunk or
+        # page (job retries, re-crawls) skips the API call
+        self.response_cache = (
+            ResponseCache(max_entries=settings.GEMINI_CACHE_SIZE)
+            if settings.GEMINI_CACHE_SIZE > 0 else None
+        )
+        
+        # (GlobalRules instance, its model_dump()), see _rules_dict
+        self._rules_dumped: Optional[tuple] = None
+    
+    def _cache_key(self, prompt: str) -> str:
+        """Cache key for a prompt; the model name is part of it"""
+        digest = hashlib.sha256(f"{settings.GEMINI_MODEL}\n{prompt}".encode()).hexdigest()
+        return f"gemini:{digest}"
+    
+    def _cached_text(self, prompt: str) -> Optional[str]:
+        """Return the cached response text for prompt, if any"""
+        if self.response_cache is None:
+            return None
+        body = self.response_cache.get(self._cache_key(prompt))
+        return body.decode() if body is not None else None
+    
+    def _store_text(self, prompt: str, text: str):
+        """Cache a response text that parsed successfully"""
+        if self.response_cache is not None:
+            self.response_cache.set(self._cache_key(prompt), text.encode(), settings.GEMINI_CACHE_TTL)
+    
+    def discard_cached(self, prompt: str):
+        """Drop a cached response, e.g. one the caller could not parse"""
+        if self.response_cache is not None:
+            self.response_cache.delete(self._cache_key(prompt))
+    
+    def get_cache_stats(self) -> dict:
+        """Get response cache statistics"""
+        if self.response_cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.response_cache.get_stats()}
+    
+    async def _generate(self, prompt: str):
+        """
+        Call the model on the event loop, bounded by GEMINI_CALL_TIMEOUT
+        
+        The async SDK client keeps one gRPC channel for the process, so
+        calls reuse its connection instead of running the blocking client
+        on short-lived executor threads. A timeout cancels the RPC itself.
+        """
+        return await asyncio.wait_for(
+            self.model.generate_content_async(prompt),
+            timeout=GEMINI_CALL_TIMEOUT
+        )
     
     @retry(
         stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=2, max=10)
+        # Full jitter: concurrent callers hitting a 429 together do not
+        # retry in lockstep
+        wait=wait_random_exponential(multiplier=1, max=10),
+        retry=_RETRY_IF
     )
     async def analyze_chunk(self, prompt_data: GeminiPromptData) -> GeminiResponse:
         """
@@ -123,15 +226,20 @@ class GeminiClient:
         
         Uses rate limiter to enforce max 3 concurrent requests
         """
+        # Build user prompt (static system prompt first)
+        user_prompt = self._build_user_prompt(prompt_data)
+        
+        cached = self._cached_text(user_prompt)
+        if cached is not None:
+            logger.info(f"Cache hit for chunk: {prompt_data.file} [{prompt_data.chunk_start}:{prompt_data.chunk_end}]")
+            return GeminiResponse.model_validate_json(cached)
+        
         # Acquire rate limiter slot (blocks if limit reached)
         async with rate_limiter:
             try:
-                # Build user prompt (with system prompt prepended)
-                user_prompt = f"{SYSTEM_PROMPT}\n\n{self._build_user_prompt(prompt_data)}"
-                
                 # Call Gemini API
                 logger.info(f"Analyzing chunk: {prompt_data.file} [{prompt_data.chunk_start}:{prompt_data.chunk_end}]")
-                response = self.model.generate_content(user_prompt)
+                response = await self._generate(user_prompt)
                 
                 # Parse JSON response
                 response_text = response.text.strip()
@@ -140,14 +248,18 @@ class GeminiClient:
                 # Clean markdown code blocks if present
                 response_text = self._clean_markdown(response_text)
                 
-                # Validate and parse
-                response_data = json.loads(response_text)
-                validated_response = GeminiResponse(**response_data)
+                # Parse and validate in one pass (no intermediate dict)
+                validated_response = GeminiResponse.model_validate_json(response_text)
+                self._store_text(user_prompt, response_text)
                 
                 logger.info(f"Found {len(validated_response.issues)} issues in chunk")
                 return validated_response
                 
-            except json.JSONDecodeError as e:
+            except ValidationError as e:
+                if not any(error['type'] == 'json_invalid' for error in e.errors()):
+                    logger.error(f"Gemini response failed validation: {e}")
+                    raise
+                
                 logger.error(f"Failed to parse Gemini JSON response: {e}")
                 logger.error(f"Raw response: {response_text}")
                 raise ValueError(f"Invalid JSON from Gemini: {e}")
@@ -156,9 +268,92 @@ class GeminiClient:
                 logger.error(f"Gemini API error: {e}")
                 raise
     
+    async def analyze_chunks_batch(
+        self,
+        prompts: List[GeminiPromptData],
+        batch_size: int = settings.GEMINI_BATCH_SIZE
+    ) -> List[GeminiResponse]:
+        """
+        Analyze several chunks with one Gemini request per batch_size chunks
+        
+        The system prompt and job-level fields are sent once per batch
+        instead of once per chunk. Results come back in prompt order;
+        cached chunks are answered without a request. All prompts must
+        belong to the same job (keywords, site and rules are taken from
+        the first one).
+        """
+        results: List[Optional[GeminiResponse]] = [None] * len(prompts)
+        pending = []
+        for index, prompt_data in enumerate(prompts):
+            cached = self._cached_text(self._build_user_prompt(prompt_data))
+            if cached is not None:
+                results[index] = GeminiResponse.model_validate_json(cached)
+            else:
+                pending.append(index)
+        
+        if pending:
+            batch_size = max(1, batch_size)
+            batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+            # One rate limiter slot per batch, not per chunk
+            answers = await asyncio.gather(*(
+                self._analyze_batch([prompts[index] for index in batch])
+                if len(batch) > 1 else self.analyze_chunk(prompts[batch[0]])
+                for batch in batches
+            ))
+            for batch, answer in zip(batches, answers):
+                if len(batch) == 1:
+                    answer = [answer]
+                for index, response in zip(batch, answer):
+                    results[index] = response
+        
+        return results
+    
+    @retry(
+        stop=stop_after_attempt(2),
+        wait=wait_random_exponential(multiplier=1, max=10),
+        retry=_RETRY_IF
+    )
+    async def _analyze_batch(self, prompts: List[GeminiPromptData]) -> List[GeminiResponse]:
+        """Send one batch of chunks to Gemini and validate the results"""
+        batch_prompt = self._build_batch_prompt(prompts)
+        
+        async with rate_limiter:
+            try:
+                logger.info(f"Analyzing batch of {len(prompts)} chunks")
+                response = await self._generate(batch_prompt)
+                response_text = self._clean_markdown(response.text)
+                
+                try:
+                    results = GeminiBatchResponse.model_validate_json(response_text).results
+                except ValidationError as e:
+                    logger.error(f"Failed to parse Gemini batch response: {e}")
+                    raise ValueError(f"Invalid batch JSON from Gemini: {e}")
+                
+                # Results are matched to chunks by position, so the order must hold
+                if len(results) != len(prompts) or any(
+                    result.chunk_start != prompt_data.chunk_start or result.chunk_end != prompt_data.chunk_end
+                    for result, prompt_data in zip(results, prompts)
+                ):
+                    raise ValueError(
+                        f"Gemini batch results do not match the {len(prompts)} chunks sent"
+                    )
+            
+            except Exception as e:
+                logger.error(f"Gemini batch API error: {e}")
+                raise
+        
+        # Cache each answer under its single-chunk prompt, so analyze_chunk
+        # and later batches reuse it
+        for prompt_data, result in zip(prompts, results):
+            self._store_text(self._build_user_prompt(prompt_data), result.model_dump_json())
+        
+        logger.info(f"Found {sum(len(result.issues) for result in results)} issues in batch")
+        return results
+    
     @retry(
         stop=stop_after_attempt(5),  # Increased from 3 to 5 retries
-        wait=wait_exponential(multiplier=2, min=4, max=30)  # Longer wait: 4s, 8s, 16s, 30s, 30s
+        wait=wait_random_exponential(multiplier=2, max=30),  # Random wait up to 4s, 8s, 16s, 30s
+        retry=_RETRY_IF
     )
     async def generate_content(self, prompt: str) -> str:
         """
@@ -170,21 +365,22 @@ class GeminiClient:
         Returns:
             Response text from Gemini
         """
+        cached = self._cached_text(prompt)
+        if cached is not None:
+            logger.debug("Gemini cache hit")
+            return cached
+        
         # Acquire rate limiter slot (blocks if limit reached)
         async with rate_limiter:
             try:
                 logger.debug(f"Generating content with Gemini (prompt length: {len(prompt)})")
-                # Run in thread pool to avoid blocking, with extended timeout handling
-                import asyncio
-                response = await asyncio.wait_for(
-                    asyncio.to_thread(self.model.generate_content, prompt),
-                    timeout=180.0  # 3 minutes per attempt (Gemini SDK default is 60s)
-                )
+                response = await self._generate(prompt)
                 response_text = response.text.strip()
                 logger.debug(f"Gemini response length: {len(response_text)}")
+                self._store_text(prompt, response_text)
                 return response_text
             except asyncio.TimeoutError:
-                logger.warning("Gemini API call timed out after 180s, will retry")
+                logger.warning(f"Gemini API call timed out after {GEMINI_CALL_TIMEOUT:.0f}s, will retry")
                 raise
             except Exception as e:
                 logger.error(f"Gemini API error: {e}")
@@ -196,39 +392,68 @@ class GeminiClient:
         
         Gemini sometimes wraps JSON in ```json ... ``` despite instructions
         """
+        # Remove ```json (or bare ```) at start and ``` at end
         text = text.strip()
+        if text.startswith("```"):
+            text = text[3:].removeprefix("json")
         
-        # Remove ```json at start and ``` at end
-        if text.startswith("```json"):
-            text = text[7:]  # Remove ```json
-        elif text.startswith("```"):
-            text = text[3:]  # Remove ```
-        
-        if text.endswith("```"):
-            text = text[:-3]  # Remove trailing ```
+        return text.removesuffix("```").strip()
+    
+    def _rules_dict(self, rules: GlobalRules) -> dict:
+        """
+        model_dump() of the prompt rules, reused while the same object is passed
         
-        return text.strip()
+        Callers share one GlobalRules instance across all chunks.
+        """
+        if self._rules_dumped is None or self._rules_dumped[0] is not rules:
+            self._rules_dumped = (rules, rules.model_dump())
+        return self._rules_dumped[1]
     
     def _build_user_prompt(self, data: GeminiPromptData) -> str:
-        """Build the user prompt with chunk data"""
+        """
+        Build the full prompt: static prefix, then the chunk data
+        
+        Fields shared by every chunk of a job (keywords, site, rules) come
+        before the per-chunk ones and the chunk content goes last, so
+        prompts within a job also share the longest possible prefix.
+        """
         prompt_dict = {
+            "keywords": data.keywords,
+            "site_language": data.site_language,
+            "site_url": data.site_url,
+            "global_rules": self._rules_dict(data.global_rules),
             "file": data.file,
             "chunk_start": data.chunk_start,
             "chunk_end": data.chunk_end,
-            "content": data.content,
             "context_head": data.context_head,
             "context_tail": data.context_tail,
-            "keywords": data.keywords,
-            "site_language": data.site_language,
-            "site_url": data.site_url,
-            "global_rules": data.global_rules.model_dump()
+            "content": data.content
         }
         
-        return f"""Analyze this code chunk and return ONLY valid JSON:
-
-{json.dumps(prompt_dict, ensure_ascii=False, indent=2)}
-
-Remember: Return ONLY the JSON object, no markdown, no explanations."""
+        return f"{CHUNK_PROMPT_PREFIX}{_dump_prompt_json(prompt_dict)}{CHUNK_PROMPT_SUFFIX}"
+    
+    def _build_batch_prompt(self, prompts: List[GeminiPromptData]) -> str:
+        """Build one prompt for several chunks of the same job"""
+        first = prompts[0]
+        prompt_dict = {
+            "keywords": first.keywords,
+            "site_language": first.site_language,
+            "site_url": first.site_url,
+            "global_rules": self._rules_dict(first.global_rules),
+            "batch": [
+                {
+                    "file": data.file,
+                    "chunk_start": data.chunk_start,
+                    "chunk_end": data.chunk_end,
+                    "context_head": data.context_head,
+                    "context_tail": data.context_tail,
+                    "content": data.content
+                }
+                for data in prompts
+            ]
+        }
+        
+        return f"{BATCH_PROMPT_PREFIX}{_dump_prompt_json(prompt_dict)}{BATCH_PROMPT_SUFFIX}"
 
 
 # Singleton instance
@@ -32,21 +32,30 @@ class MemoryGuard:
         """
         try:
             total_size = 0
-            directory_path = Path(directory)
+            stack = [directory]
             
-            # Calculate total size recursively
-            for item in directory_path.rglob('*'):
-                if item.is_file():
-                    total_size += item.stat().st_size
-                    
-                    # Early exit if exceeded
-                    if total_size > self.MAX_EXTRACTED_SIZE_BYTES:
-                        logger.error(
-                            f"🔴 MEMORY LIMIT EXCEEDED: {directory} "
-                            f"size={self.format_size(total_size)} "
-                            f"limit={self.format_size(self.MAX_EXTRACTED_SIZE_BYTES)}"
-                        )
-                        return False, total_size, self.format_size(total_size)
+            # Calculate total size recursively; DirEntry type checks come
+            # from the directory listing, symlinks are neither followed nor counted
+            while stack:
+                with os.scandir(stack.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                            continue
+                        
+                        if not entry.is_file(follow_symlinks=False):
+                            continue
+                        
+                        total_size += entry.stat(follow_symlinks=False).st_size
+                        
+                        # Early exit if exceeded
+                        if total_size > self.MAX_EXTRACTED_SIZE_BYTES:
+                            logger.error(
+                                f"🔴 MEMORY LIMIT EXCEEDED: {directory} "
+                                f"size={self.format_size(total_size)} "
+                                f"limit={self.format_size(self.MAX_EXTRACTED_SIZE_BYTES)}"
+                            )
+                            return False, total_size, self.format_size(total_size)
             
             logger.info(
                 f"✅ Memory check passed: {directory} "
@@ -2,11 +2,65 @@ from bs4 import BeautifulSoup
 from pathlib import Path
 import shutil
 import logging
-from datetime import datetime
+import os
+import itertools
+import re
+import tempfile
+import time
 from typing import Tuple, Optional
 
 logger = logging.getLogger(__name__)
 
+# Buffer for writing patched files
+WRITE_BUFFER_SIZE = 1 << 20  # 1MB
+
+# Per-process sequence for backup names: patches applied within the same
+# second would otherwise get the same name and overwrite each other's backup
+_BACKUP_SEQ = itertools.count()
+
+# Line boundaries as str.splitlines() sees them, so line numbers match the chunker
+_LINE_BREAK = re.compile(r'\r\n|[\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029]')
+
+
+def _line_bounds(content: str, line_number: int) -> Optional[Tuple[int, int]]:
+    """
+    (start, end) offsets of 1-indexed line_number in content, its line
+    break included; None past the last line
+    
+    Scans only up to the requested line instead of splitting the whole file.
+    """
+    breaks = _LINE_BREAK.finditer(content)
+    start = 0
+    
+    for _ in range(line_number - 1):
+        match = next(breaks, None)
+        if match is None:
+            return None
+        start = match.end()
+    
+    if start >= len(content):
+        return None
+    
+    match = next(breaks, None)
+    return start, match.end() if match else len(content)
+
+
+def _require_line(content: str, line_number: int) -> Tuple[int, int]:
+    """Offsets of an existing line; ValueError if line_number is out of range"""
+    bounds = _line_bounds(content, line_number) if line_number > 0 else None
+    if bounds is None:
+        raise ValueError(f"Line number {line_number} out of range")
+    return bounds
+
+
+def _insert_after_line(content: str, line_number: int, text: str, allow_start: bool = False) -> str:
+    """Splice text in after line_number (line 0 = file start, if allow_start)"""
+    if allow_start and line_number == 0:
+        return text + content
+    
+    _, end = _require_line(content, line_number)
+    return content[:end] + text + content[end:]
+
 
 class PatchEngine:
     """
@@ -21,20 +75,30 @@ class PatchEngine:
         self.backup_dir = Path(backup_dir)
         self.backup_dir.mkdir(parents=True, exist_ok=True)
     
-    def create_backup(self, file_path: str) -> str:
+    def create_backup(self, file_path: str) -> Tuple[str, bytes]:
         """
         Create backup of file before patching
-        Returns backup file path
+        Returns (backup file path, original file bytes)
         """
         file_path = Path(file_path)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_name = f"{file_path.stem}_{timestamp}{file_path.suffix}.bak"
+        # Epoch seconds + pid + sequence: unique across workers and bursts
+        suffix = f"{int(time.time())}_{os.getpid()}_{next(_BACKUP_SEQ)}"
+        backup_name = f"{file_path.stem}_{suffix}{file_path.suffix}.bak"
         backup_path = self.backup_dir / backup_name
         
-        shutil.copy2(file_path, backup_path)
+        try:
+            # Hard link: no data is copied. Patched files are always swapped
+            # in with os.replace (never rewritten in place), so the linked
+            # inode keeps the pre-patch content.
+            os.link(file_path, backup_path)
+        except OSError:
+            # Backup dir on another filesystem (EXDEV) or no hard link support
+            shutil.copy2(file_path, backup_path)
+        
+        original_bytes = file_path.read_bytes()
         logger.info(f"Created backup: {backup_path}")
         
-        return str(backup_path)
+        return str(backup_path), original_bytes
     
     def apply_patch(
         self,
@@ -50,35 +114,12 @@ class PatchEngine:
         Returns: (success, backup_path, error_message)
         """
         try:
-            # Create backup first
-            backup_path = self.create_backup(file_path)
-            
-            # Read original content
-            with open(file_path, 'r', encoding='utf-8') as f:
-                original_content = f.read()
-            
-            # Determine file type
-            if file_type is None:
-                file_type = Path(file_path).suffix.lower()
-            
-            # Apply patch based on file type
-            if file_type in ['.php', '.html', '.htm']:
-                patched_content = self._apply_dom_patch(
-                    original_content, line_number, action, code
-                )
-            elif file_type in ['.js', '.jsx', '.ts', '.tsx']:
-                patched_content = self._apply_line_patch(
-                    original_content, line_number, action, code
-                )
-            else:
-                # Default to line-based
-                patched_content = self._apply_line_patch(
-                    original_content, line_number, action, code
-                )
+            # Create backup first; its bytes double as the original content
+            backup_path, original_bytes = self.create_backup(file_path)
+            original_content = original_bytes.decode('utf-8')
+            del original_bytes
             
-            # Write patched content
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(patched_content)
+            self.patch_file(file_path, original_content, line_number, action, code, file_type)
             
             logger.info(f"Successfully patched {file_path} at line {line_number}")
             return True, backup_path, None
@@ -93,6 +134,67 @@ class PatchEngine:
             
             return False, None, error_msg
     
+    def patch_file(
+        self,
+        file_path: str,
+        original_content: str,
+        line_number: int,
+        action: str,
+        code: str,
+        file_type: str = None
+    ):
+        """
+        Patch file_path, whose current text is original_content, without a backup
+        
+        For callers that already hold a backup (e.g. a sandbox copy of a file
+        backed up by the caller). Raises on failure; the file is then untouched.
+        """
+        # Text-mode newline translation, as open(..., 'r') did
+        original_content = original_content.replace('\r\n', '\n').replace('\r', '\n')
+        
+        # Determine file type
+        if file_type is None:
+            file_type = Path(file_path).suffix.lower()
+        
+        # Apply patch based on file type
+        if file_type in ['.php', '.html', '.htm']:
+            patched_content = self._apply_dom_patch(
+                original_content, line_number, action, code
+            )
+        elif file_type in ['.js', '.jsx', '.ts', '.tsx']:
+            patched_content = self._apply_line_patch(
+                original_content, line_number, action, code
+            )
+        else:
+            # Default to line-based
+            patched_content = self._apply_line_patch(
+                original_content, line_number, action, code
+            )
+        
+        # Write patched content
+        self._write_atomic(file_path, patched_content)
+    
+    def _write_atomic(self, file_path: str, content: str):
+        """
+        Write content to a temp file next to file_path, then os.replace it in
+        
+        Readers see either the old or the new file, never a partial write.
+        The file keeps its permission bits.
+        """
+        file_path = Path(file_path)
+        fd, temp_path = tempfile.mkstemp(
+            prefix=f".{file_path.name}.", suffix=".tmp", dir=file_path.parent
+        )
+        
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as f:
+                f.write(content)
+            shutil.copymode(file_path, temp_path)
+            os.replace(temp_path, file_path)
+        except BaseException:
+            Path(temp_path).unlink(missing_ok=True)
+            raise
+    
     def _apply_dom_patch(
         self,
         content: str,
@@ -107,29 +209,18 @@ class PatchEngine:
         # For DOM-based patching, we need to be smart about where to insert
         # This is a simplified version - production would need more sophisticated logic
         
-        lines = content.splitlines(keepends=True)
-        
         if action == "insert_after_line":
-            if line_number <= len(lines):
-                lines.insert(line_number, code + '\n')
-            else:
-                raise ValueError(f"Line number {line_number} out of range")
+            return _insert_after_line(content, line_number, code + '\n', allow_start=True)
         
         elif action == "replace_line":
-            if 0 < line_number <= len(lines):
-                lines[line_number - 1] = code + '\n'
-            else:
-                raise ValueError(f"Line number {line_number} out of range")
+            start, end = _require_line(content, line_number)
+            return content[:start] + code + '\n' + content[end:]
         
         elif action == "annotate":
             # For annotate, add as comment
-            if 0 < line_number <= len(lines):
-                comment = f"<!-- SEO NOTE: {code} -->\n"
-                lines.insert(line_number, comment)
-            else:
-                raise ValueError(f"Line number {line_number} out of range")
+            return _insert_after_line(content, line_number, f"<!-- SEO NOTE: {code} -->\n")
         
-        return ''.join(lines)
+        return content
     
     def _apply_line_patch(
         self,
@@ -142,40 +233,47 @@ class PatchEngine:
         Apply patch using line-based approach
         Used for JS/React files
         """
-        lines = content.splitlines(keepends=True)
-        
         if action == "insert_after_line":
-            if line_number <= len(lines):
-                lines.insert(line_number, code + '\n')
-            else:
-                raise ValueError(f"Line number {line_number} out of range")
+            return _insert_after_line(content, line_number, code + '\n', allow_start=True)
         
         elif action == "replace_line":
-            if 0 < line_number <= len(lines):
-                # Preserve indentation
-                original_line = lines[line_number - 1]
-                indent = len(original_line) - len(original_line.lstrip())
-                indented_code = ' ' * indent + code.lstrip()
-                lines[line_number - 1] = indented_code + '\n'
-            else:
-                raise ValueError(f"Line number {line_number} out of range")
+            start, end = _require_line(content, line_number)
+            
+            # Preserve indentation
+            original_line = content[start:end]
+            indent = len(original_line) - len(original_line.lstrip())
+            indented_code = ' ' * indent + code.lstrip()
+            return content[:start] + indented_code + '\n' + content[end:]
         
         elif action == "annotate":
             # For JS, add as comment
-            if 0 < line_number <= len(lines):
-                comment = f"// SEO NOTE: {code}\n"
-                lines.insert(line_number, comment)
-            else:
-                raise ValueError(f"Line number {line_number} out of range")
+            return _insert_after_line(content, line_number, f"// SEO NOTE: {code}\n")
         
-        return ''.join(lines)
+        return content
     
     def rollback(self, file_path: str, backup_path: str) -> bool:
         """
         Rollback file to backup version
         """
         try:
-            shutil.copy2(backup_path, file_path)
+            if os.path.samefile(backup_path, file_path):
+                # Still linked to its backup: the file was never replaced
+                return True
+            
+            # Stage the copy next to the file and swap it in, so the inode
+            # shared with other backups is never written to
+            file_path = Path(file_path)
+            fd, temp_path = tempfile.mkstemp(
+                prefix=f".{file_path.name}.", suffix=".tmp", dir=file_path.parent
+            )
+            os.close(fd)
+            try:
+                shutil.copy2(backup_path, temp_path)
+                os.replace(temp_path, file_path)
+            except BaseException:
+                Path(temp_path).unlink(missing_ok=True)
+                raise
+            
             logger.info(f"Rolled back {file_path} from {backup_path}")
             return True
         except Exception as e:
@@ -242,19 +340,12 @@ class PatchEngine:
             soup = BeautifulSoup(content, 'lxml')
             
             # DOM integrity checks
-            # 1. Check for unclosed script tags
-            scripts = soup.find_all('script')
-            for script in scripts:
-                if script.string is None and len(list(script.children)) == 0:
-                    # Empty script tag is OK
-                    continue
-            
-            # 2. Check for unclosed head tag
+            # 1. Check for unclosed head tag
             heads = soup.find_all('head')
             if len(heads) > 1:
                 return False, "Multiple <head> tags found - DOM integrity compromised"
             
-            # 3. Check for unclosed body tag
+            # 2. Check for unclosed body tag
             bodies = soup.find_all('body')
             if len(bodies) > 1:
                 return False, "Multiple <body> tags found - DOM integrity compromised"
@@ -1,7 +1,11 @@
 import shutil
+import os
+import errno
 from pathlib import Path
 from typing import Tuple, Optional
 import tempfile
+import itertools
+import threading
 import logging
 
 logger = logging.getLogger(__name__)
@@ -26,6 +30,8 @@ class PatchSandbox:
             self.sandbox_dir = Path(tempfile.gettempdir()) / "seo_checker_sandbox"
         
         self.sandbox_dir.mkdir(parents=True, exist_ok=True)
+        # Unique suffix per temp copy (patches can run in parallel threads)
+        self._temp_counter = itertools.count()
         logger.info(f"PatchSandbox initialized: {self.sandbox_dir}")
     
     def create_temp_copy(self, original_path: str) -> str:
@@ -37,12 +43,22 @@ class PatchSandbox:
         try:
             original = Path(original_path)
             
-            # Create unique temp filename
-            temp_name = f"{original.stem}_temp_{id(self)}{original.suffix}"
-            temp_path = self.sandbox_dir / temp_name
+            # Unique across worker processes and threads
+            prefix = f"{original.stem}_temp_{os.getpid()}_{threading.get_ident()}_"
+            temp_path = self.sandbox_dir / f"{prefix}{next(self._temp_counter)}{original.suffix}"
             
-            # Copy file
-            shutil.copy2(original, temp_path)
+            try:
+                # Hard link: no data is copied. Patches swap a new file in
+                # with os.replace, so the original's inode is never written.
+                os.link(original, temp_path)
+            except OSError:
+                # Sandbox on another filesystem (EXDEV), no hard link
+                # support, or the name is taken: copy into a fresh mkstemp file
+                fd, temp_path = tempfile.mkstemp(
+                    prefix=prefix, suffix=original.suffix, dir=self.sandbox_dir
+                )
+                os.close(fd)
+                shutil.copy2(original, temp_path)
             
             logger.debug(f"Created temp copy: {original} → {temp_path}")
             return str(temp_path)
@@ -58,11 +74,11 @@ class PatchSandbox:
         validate_func: callable,
         *patch_args,
         **patch_kwargs
-    ) -> Tuple[bool, Optional[str], Optional[str]]:
+    ) -> Tuple[bool, Optional[str], Optional[str], Optional[bytes]]:
         """
         Apply patch to temp copy and validate before replacing original
         
-        Returns: (success, temp_path, error_message)
+        Returns: (success, temp_path, error_message, patched_bytes)
         """
         temp_path = None
         
@@ -76,7 +92,7 @@ class PatchSandbox:
             
             if not success:
                 logger.error(f"Patch application failed: {error}")
-                return False, temp_path, error
+                return False, temp_path, error, None
             
             # Step 3: Validate temp copy
             logger.info(f"Validating temp copy: {temp_path}")
@@ -84,19 +100,46 @@ class PatchSandbox:
             
             if not is_valid:
                 logger.error(f"Validation failed: {validation_error}")
-                return False, temp_path, validation_error
+                return False, temp_path, validation_error, None
             
-            # Step 4: Validation passed - replace original
+            # Step 4: Validation passed - swap the patched copy in
             logger.info(f"Validation passed, replacing original: {original_path}")
-            shutil.copy2(temp_path, original_path)
+            patched_bytes = Path(temp_path).read_bytes()
+            self._replace_original(temp_path, original_path)
             
             logger.info(f"Successfully patched file: {original_path}")
-            return True, temp_path, None
+            return True, temp_path, None, patched_bytes
         
         except Exception as e:
             error_msg = f"Sandbox patch failed: {e}"
             logger.error(error_msg)
-            return False, temp_path, error_msg
+            return False, temp_path, error_msg, None
+    
+    def _replace_original(self, temp_path: str, original_path: str):
+        """
+        Atomically replace original_path with temp_path
+        
+        The original is never rewritten in place, so hard-linked backups of
+        it keep their content.
+        """
+        try:
+            os.replace(temp_path, original_path)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            
+            # Sandbox on another filesystem: stage a copy next to the original
+            original = Path(original_path)
+            fd, staged_path = tempfile.mkstemp(
+                prefix=f".{original.name}.", suffix=".tmp", dir=original.parent
+            )
+            os.close(fd)
+            try:
+                shutil.copy2(temp_path, staged_path)
+                os.replace(staged_path, original_path)
+            except BaseException:
+                Path(staged_path).unlink(missing_ok=True)
+                raise
     
     def cleanup_temp(self, temp_path: str):
         """Clean up temporary file"""
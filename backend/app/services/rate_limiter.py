@@ -44,11 +44,14 @@ class GeminiRateLimiter:
             f"(active={self.active_requests}, queue={self.queue_size})"
         )
         
-        await self.semaphore.acquire()
+        try:
+            await self.semaphore.acquire()
+        finally:
+            # Also when the waiting task is cancelled (e.g. by a timeout)
+            self.queue_size -= 1
         
         wait_time = time.time() - start_time
         self.total_wait_time += wait_time
-        self.queue_size -= 1
         self.active_requests += 1
         self.total_requests += 1
         
@@ -0,0 +1,75 @@
+import time
+import logging
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    In-process TTL cache of byte strings by key
+
+    Holds rendered JSON bodies for the polled read endpoints, so repeated
+    requests skip the database, and Gemini response texts keyed by prompt
+    hash (see GeminiClient). Entries are per worker process; writers
+    invalidate keys explicitly.
+    """
+
+    MAX_ENTRIES = 1024
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        # key -> (expires_at, body)
+        self._entries: Dict[str, Tuple[float, bytes]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the cached body for key, or None if missing/expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, body = entry
+        if expires_at <= time.monotonic():
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return body
+
+    def set(self, key: str, body: bytes, ttl: float) -> None:
+        """Store body under key for ttl seconds"""
+        if len(self._entries) >= self.max_entries and key not in self._entries:
+            self._evict()
+        self._entries[key] = (time.monotonic() + ttl, body)
+
+    def delete(self, *keys: str) -> None:
+        """Invalidate the given keys"""
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def _evict(self) -> None:
+        """Drop expired entries, then the oldest one if still full"""
+        now = time.monotonic()
+        expired = [key for key, (expires_at, _) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+
+        if len(self._entries) >= self.max_entries:
+            # Dicts keep insertion order: the first key is the oldest write
+            del self._entries[next(iter(self._entries))]
+
+    def get_stats(self) -> dict:
+        """Get cache statistics"""
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+# Singleton instance
+response_cache = ResponseCache()
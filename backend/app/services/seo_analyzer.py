@@ -4,7 +4,7 @@ Analyzes HTML content using Gemini AI and generates SEO recommendations
 """
 import json
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import re
 
 from app.services.gemini_client import GeminiClient
@@ -242,7 +242,14 @@ class SEOAnalyzer:
             response_text = await self.gemini.generate_content(prompt)
             
             # Parse JSON response
-            result = self._parse_gemini_response(response_text)
+            result, is_valid = self._parse_gemini_response(response_text)
+            
+            # Unparseable JSON or entries failing validation: don't let the
+            # response cache serve the same answer on the next run (a clean
+            # page legitimately has no issues, so emptiness alone is fine)
+            if not is_valid:
+                self.gemini.discard_cached(prompt)
+            
             return result
             
         except Exception as e:
@@ -426,8 +433,13 @@ Aşağıdaki konularda DETAYLI analiz yap:
         
         return prompt
     
-    def _parse_gemini_response(self, response_text: str) -> GeminiSEOResponse:
-        """Parse Gemini JSON response"""
+    def _parse_gemini_response(self, response_text: str) -> Tuple[GeminiSEOResponse, bool]:
+        """
+        Parse Gemini JSON response
+        
+        Returns the response and whether all of it parsed and validated;
+        invalid entries are skipped, unparseable JSON gives an empty response.
+        """
         
         try:
             # Extract JSON from response (handle markdown code blocks)
@@ -469,41 +481,31 @@ Aşağıdaki konularda DETAYLI analiz yap:
                 raise
             
             # Parse issues
+            invalid_entries = 0
             issues = []
             for issue_data in data.get('issues', []):
                 try:
-                    issue = GeminiSEOIssue(
-                        type=SEOIssueType(issue_data['type']),
-                        line=issue_data.get('line'),
-                        reason=issue_data['reason'],
-                        recommendation=issue_data['recommendation'],
-                        example_fix=issue_data.get('example_fix', ''),
-                        severity=SEOIssueSeverity(issue_data['severity']),
-                        confidence=float(issue_data['confidence'])
-                    )
-                    issues.append(issue)
+                    # Single pydantic-core pass (enum/float coercion included)
+                    issues.append(GeminiSEOIssue.model_validate(issue_data))
                 except Exception as e:
                     logger.warning(f"Error parsing issue: {str(e)}")
+                    invalid_entries += 1
                     continue
             
             # Parse keyword scores
             keyword_scores = {}
             for kw, score_data in data.get('keyword_scores', {}).items():
                 try:
-                    score = GeminiKeywordScore(
-                        presence_score=float(score_data['presence_score']),
-                        prominence=float(score_data['prominence']),
-                        recommendation=score_data['recommendation']
-                    )
-                    keyword_scores[kw] = score
+                    keyword_scores[kw] = GeminiKeywordScore.model_validate(score_data)
                 except Exception as e:
                     logger.warning(f"Error parsing keyword score for {kw}: {str(e)}")
+                    invalid_entries += 1
                     continue
             
             return GeminiSEOResponse(
                 issues=issues,
                 keyword_scores=keyword_scores
-            )
+            ), invalid_entries == 0
             
         except Exception as e:
             logger.error(f"Error parsing Gemini response: {str(e)}")
@@ -513,7 +515,7 @@ Aşağıdaki konularda DETAYLI analiz yap:
             return GeminiSEOResponse(
                 issues=[],
                 keyword_scores={}
-            )
+            ), False
     
     def _fix_json_string(self, json_str: str) -> str:
         """
@@ -647,25 +649,23 @@ Aşağıdaki konularda DETAYLI analiz yap:
     def _deduplicate_issues(self, issues: List[GeminiSEOIssue]) -> List[GeminiSEOIssue]:
         """Remove duplicate issues - improved version"""
         
-        seen = set()
+        # key -> index in unique_issues
+        seen = {}
         unique_issues = []
         
         for issue in issues:
             # Create unique key based on type, severity, and normalized reason
             # Normalize reason by removing extra whitespace and taking first 50 chars
             normalized_reason = ' '.join(issue.reason.split())[:50].lower()
-            key = f"{issue.type.value}:{issue.severity.value}:{normalized_reason}"
+            key = (issue.type, issue.severity, normalized_reason)
             
-            if key not in seen:
-                seen.add(key)
+            index = seen.get(key)
+            if index is None:
+                seen[key] = len(unique_issues)
                 unique_issues.append(issue)
-            else:
+            elif issue.confidence > unique_issues[index].confidence:
                 # If duplicate found, keep the one with higher confidence
-                for i, existing in enumerate(unique_issues):
-                    existing_key = f"{existing.type.value}:{existing.severity.value}:{' '.join(existing.reason.split())[:50].lower()}"
-                    if existing_key == key and issue.confidence > existing.confidence:
-                        unique_issues[i] = issue
-                        break
+                unique_issues[index] = issue
         
         return unique_issues
     
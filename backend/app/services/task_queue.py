@@ -0,0 +1,119 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# A queued call: (func, args, kwargs)
+Job = Tuple[Callable[..., Awaitable[Any]], tuple, dict]
+
+
+class QueueFullError(Exception):
+    """Raised by enqueue when the queue already holds maxsize jobs"""
+    pass
+
+
+class TaskQueue:
+    """
+    In-process work queue drained by a fixed pool of worker tasks
+
+    Long-running pipelines are enqueued here instead of running as
+    request BackgroundTasks, so concurrency is bounded and jobs outlive
+    the request that submitted them. At most maxsize jobs wait at once
+    (0 means unbounded).
+    """
+
+    def __init__(self, name: str, maxsize: int = 0):
+        self.name = name
+        self.maxsize = maxsize
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        # Jobs cancelled mid-run by stop()
+        self._interrupted: List[Job] = []
+        self.total_enqueued = 0
+        self.total_failed = 0
+        self.total_rejected = 0
+
+    async def start(self, worker_count: int) -> None:
+        """Create the queue and spawn workers (call from the running loop)"""
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._interrupted = []
+        self._workers = [
+            asyncio.create_task(self._worker(index), name=f"{self.name}-worker-{index}")
+            for index in range(worker_count)
+        ]
+        logger.info(f"TaskQueue '{self.name}' started with {worker_count} workers")
+
+    async def stop(self) -> List[Job]:
+        """
+        Cancel workers and return the jobs that did not finish
+
+        Those are the running jobs that were cancelled plus the queued
+        ones no worker started; the caller decides what to do with them.
+        """
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+        abandoned = self._interrupted
+        while self._queue is not None and not self._queue.empty():
+            abandoned.append(self._queue.get_nowait())
+
+        if abandoned:
+            logger.warning(f"TaskQueue '{self.name}' stopped with {len(abandoned)} unfinished jobs")
+
+        self._workers = []
+        self._interrupted = []
+        self._queue = None
+        return abandoned
+
+    def is_full(self) -> bool:
+        """True when enqueue would raise QueueFullError"""
+        return self._queue is not None and self._queue.full()
+
+    def enqueue(self, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> None:
+        """Queue func(*args, **kwargs) for a worker"""
+        if self._queue is None:
+            raise RuntimeError(f"TaskQueue '{self.name}' is not running")
+
+        try:
+            self._queue.put_nowait((func, args, kwargs))
+        except asyncio.QueueFull:
+            self.total_rejected += 1
+            raise QueueFullError(f"TaskQueue '{self.name}' is full ({self.maxsize} jobs queued)")
+        self.total_enqueued += 1
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            job = await self._queue.get()
+            func, args, kwargs = job
+            try:
+                await func(*args, **kwargs)
+            except asyncio.CancelledError:
+                # stop() while running: reported back as unfinished
+                self._interrupted.append(job)
+                raise
+            except Exception as e:
+                self.total_failed += 1
+                logger.error(f"TaskQueue '{self.name}' job {func.__name__} failed: {e}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    def get_stats(self) -> dict:
+        """Get queue statistics"""
+        return {
+            "name": self.name,
+            "workers": len(self._workers),
+            "queued": self._queue.qsize() if self._queue else 0,
+            "max_queued": self.maxsize,
+            "total_enqueued": self.total_enqueued,
+            "total_failed": self.total_failed,
+            "total_rejected": self.total_rejected
+        }
+
+
+# Singleton instance
+seo_analysis_queue = TaskQueue("seo-analysis", maxsize=settings.SEO_ANALYSIS_QUEUE_SIZE)
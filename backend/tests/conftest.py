@@ -0,0 +1,4 @@
+import os
+
+# app.config requires a key at import time; tests never call the API
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
@@ -0,0 +1,92 @@
+import pytest
+
+from app.services.chunker import Chunker
+
+
+@pytest.mark.parametrize("line_break", ['\n', '\r', '\r\n', '\x0b', '\x0c', '\x1c', '\x1d', '\x1e', '\x85', ' ', ' '])
+def test_trailing_line_break_is_not_part_of_chunk(line_break):
+    chunks = Chunker(chunk_size=5, overlap=1, context_lines=2).chunk_file("f.html", f"a{line_break}")
+    
+    assert len(chunks) == 1
+    assert chunks[0].content == "a"
+    assert (chunks[0].start_line, chunks[0].end_line) == (1, 1)
+
+
+@pytest.mark.parametrize("line_break", ['\r', '\x0c', ' '])
+def test_mixed_line_breaks_match_splitlines(line_break):
+    content = f"one{line_break}two\nthree{line_break}four{line_break}"
+    
+    chunks = Chunker(chunk_size=2, overlap=0, context_lines=1).chunk_file("f.js", content)
+    
+    assert [chunk.content for chunk in chunks] == ["one\ntwo", "three\nfour"]
+    assert chunks[0].context_tail == "three"
+    assert chunks[1].context_head == "two"
+
+
+def _lines(count):
+    return "".join(f"line {number}\n" for number in range(1, count + 1))
+
+
+def test_chunks_overlap_and_carry_context():
+    chunks = Chunker(chunk_size=4, overlap=1, context_lines=2).chunk_file("f.js", _lines(10))
+    
+    assert [(chunk.start_line, chunk.end_line) for chunk in chunks] == [(1, 4), (4, 7), (7, 10)]
+    assert chunks[0].content == "line 1\nline 2\nline 3\nline 4"
+    assert chunks[0].context_head is None
+    assert chunks[0].context_tail == "line 5\nline 6"
+    assert chunks[1].context_head == "line 2\nline 3"
+    assert chunks[-1].context_tail is None
+    assert all(chunk.line_count == chunk.end_line - chunk.start_line + 1 for chunk in chunks)
+
+
+def test_empty_file_has_no_chunks():
+    assert Chunker().chunk_file("f.html", "") == []
+
+
+@pytest.mark.parametrize("open_tag, close_tag", [
+    ("<script>", "</script>"),
+    ('<script type="application/ld+json">', "</script>"),
+    ("<head>", "</head>"),
+    ("<style>", "</style>"),
+])
+def test_chunk_is_expanded_to_close_a_semantic_block(open_tag, close_tag):
+    content = f"a\nb\n{open_tag}\nc\nd\ne\n{close_tag}\nf\ng\nh\n"
+    
+    chunks = Chunker(chunk_size=4, overlap=0, context_lines=0).chunk_file("f.html", content)
+    
+    assert (chunks[0].start_line, chunks[0].end_line) == (1, 7)
+    assert chunks[0].content.endswith(close_tag)
+    assert (chunks[1].start_line, chunks[1].end_line) == (8, 10)
+
+
+def test_unclosed_block_does_not_expand_chunk():
+    content = "a\n<script>\n" + _lines(6)
+    
+    chunks = Chunker(chunk_size=4, overlap=0, context_lines=0).chunk_file("f.html", content)
+    
+    assert chunks[0].end_line == 4
+
+
+def test_chunk_directory_filters_by_extension(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "index.html").write_text(_lines(3))
+    (tmp_path / "sub" / "app.js").write_text(_lines(5))
+    (tmp_path / "notes.txt").write_text(_lines(3))
+    (tmp_path / "empty.css").write_text("")
+    
+    all_chunks = Chunker(chunk_size=4, overlap=1, context_lines=1).chunk_directory(str(tmp_path))
+    
+    assert set(all_chunks) == {str(tmp_path / "index.html"), str(tmp_path / "sub" / "app.js")}
+    assert len(all_chunks[str(tmp_path / "sub" / "app.js")]) == 2
+
+
+def test_chunk_directory_uses_inventory_content(tmp_path):
+    inventory = [
+        {"absolute_path": str(tmp_path / "a.html"), "file_type": ".html", "content": "x\ny\n"},
+        {"absolute_path": str(tmp_path / "b.txt"), "file_type": ".txt", "content": "z\n"},
+    ]
+    
+    all_chunks = Chunker().chunk_directory(str(tmp_path), inventory=inventory)
+    
+    assert list(all_chunks) == [str(tmp_path / "a.html")]
+    assert all_chunks[str(tmp_path / "a.html")][0].content == "x\ny"
@@ -0,0 +1,110 @@
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+from app.services import file_handler as file_handler_module
+from app.services.file_handler import FileHandler, ExtractionTooLargeError
+
+
+@pytest.fixture
+def handler(tmp_path):
+    return FileHandler(str(tmp_path / "workspace"))
+
+
+def _make_zip(path, members):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zip_ref:
+        for name, data in members.items():
+            zip_ref.writestr(name, data)
+    return path
+
+
+def _make_tar(path, members):
+    with tarfile.open(path, "w:gz") as tar_ref:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar_ref.addfile(info, io.BytesIO(data))
+    return path
+
+
+@pytest.fixture
+def python_extractors(monkeypatch):
+    monkeypatch.setattr(file_handler_module, "BSDTAR_PATH", None)
+
+
+@pytest.mark.parametrize("make_archive, name", [(_make_zip, "site.zip"), (_make_tar, "site.tar.gz")])
+def test_extract_writes_members(handler, tmp_path, python_extractors, make_archive, name):
+    archive = make_archive(tmp_path / name, {"index.html": b"<html></html>", "js/app.js": b"x"})
+    
+    extract_dir = handler.extract_archive(str(archive), "job")
+    
+    assert (tmp_path / "workspace" / "job" / "extracted" / "js" / "app.js").read_bytes() == b"x"
+    assert extract_dir == str(tmp_path / "workspace" / "job" / "extracted")
+
+
+@pytest.mark.parametrize("make_archive, name", [(_make_zip, "site.zip"), (_make_tar, "site.tar.gz")])
+def test_extract_skips_members_outside_extract_dir(handler, tmp_path, python_extractors, make_archive, name):
+    archive = make_archive(tmp_path / name, {"../evil.html": b"evil", "index.html": b"ok"})
+    
+    extract_dir = handler.extract_archive(str(archive), "job")
+    
+    assert (tmp_path / "workspace" / "job" / "extracted" / "index.html").read_bytes() == b"ok"
+    assert not (tmp_path / "workspace" / "job" / "evil.html").exists()
+    assert [path.name for path in (tmp_path / "workspace" / "job").iterdir()] == ["extracted"]
+    assert extract_dir == str(tmp_path / "workspace" / "job" / "extracted")
+
+
+@pytest.mark.parametrize("make_archive, name", [(_make_zip, "site.zip"), (_make_tar, "site.tar.gz")])
+def test_extract_enforces_max_size(handler, tmp_path, python_extractors, make_archive, name):
+    archive = make_archive(tmp_path / name, {"a.html": b"x" * 600, "b.html": b"y" * 600})
+    
+    with pytest.raises(ExtractionTooLargeError):
+        handler.extract_archive(str(archive), "job", max_size=1000)
+    
+    assert handler.extract_archive(str(archive), "job2", max_size=1200)
+
+
+def test_bsdtar_rejects_declared_size_before_extracting(handler, tmp_path, monkeypatch):
+    monkeypatch.setattr(file_handler_module, "BSDTAR_PATH", "/usr/bin/bsdtar")
+    monkeypatch.setattr(
+        file_handler_module.subprocess, "run",
+        lambda *args, **kwargs: pytest.fail("bsdtar must not run past the declared size")
+    )
+    archive = _make_zip(tmp_path / "site.zip", {"a.html": b"x" * 600, "b.html": b"y" * 600})
+    
+    with pytest.raises(ExtractionTooLargeError):
+        handler.extract_archive(str(archive), "job", max_size=1000)
+    
+    assert not (tmp_path / "workspace" / "job" / "extracted").exists()
+
+
+requires_bsdtar = pytest.mark.skipif(file_handler_module.BSDTAR_PATH is None, reason="bsdtar not installed")
+
+
+@requires_bsdtar
+@pytest.mark.parametrize("make_archive, name", [(_make_zip, "site.zip"), (_make_tar, "site.tar.gz")])
+def test_bsdtar_extracts_within_limit(handler, tmp_path, make_archive, name):
+    archive = make_archive(tmp_path / name, {"index.html": b"<html></html>", "js/app.js": b"x"})
+    
+    extract_dir = handler.extract_archive(str(archive), "job", max_size=1000)
+    
+    assert (tmp_path / "workspace" / "job" / "extracted" / "js" / "app.js").read_bytes() == b"x"
+    assert extract_dir == str(tmp_path / "workspace" / "job" / "extracted")
+
+
+@requires_bsdtar
+@pytest.mark.parametrize("members", [
+    {"a.html": b"x" * 2000},
+    {"a.html": b"x" * 600, "b.html": b"y" * 600},
+])
+def test_bsdtar_enforces_limit_when_headers_lie(handler, tmp_path, monkeypatch, members):
+    # Declared sizes pass the pre-check; the rlimit or the written total must catch it
+    monkeypatch.setattr(FileHandler, "peek_uncompressed_size", lambda self, path: 0)
+    archive = _make_tar(tmp_path / "site.tar.gz", members)
+    
+    with pytest.raises(ExtractionTooLargeError):
+        handler.extract_archive(str(archive), "job", max_size=1000)
+    
+    assert not (tmp_path / "workspace" / "job" / "extracted").exists()
@@ -0,0 +1,93 @@
+import pytest
+
+from app.services.patch_engine import PatchEngine
+
+
+@pytest.fixture
+def engine(tmp_path):
+    return PatchEngine(backup_dir=str(tmp_path / "backups"))
+
+
+def _write(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+@pytest.mark.parametrize("html, message", [
+    (b"<html><head><title>a</title></head><head><title>b</title></head><body>x</body></html>", "Multiple <head>"),
+    (b"<html><head></head><body>a</body><body>b</body></html>", "Multiple <body>"),
+])
+def test_validate_html_rejects_duplicate_sections(engine, tmp_path, html, message):
+    is_valid, error = engine.validate_patch(_write(tmp_path, "page.html", html))
+    
+    assert not is_valid
+    assert message in error
+
+
+def test_validate_html_rejects_invalid_utf8(engine, tmp_path):
+    is_valid, error = engine.validate_patch(_write(tmp_path, "page.html", b"<html><body>\xff\xfe</body></html>"))
+    
+    assert not is_valid
+    assert "DOM integrity check failed" in error
+
+
+def test_validate_html_accepts_well_formed_page(engine, tmp_path):
+    html = b"<html><head><title>t</title></head><body><script>var s = '<body>';</script></body></html>"
+    
+    assert engine.validate_patch(_write(tmp_path, "page.html", html)) == (True, None)
+
+
+@pytest.mark.parametrize("name, action, code, expected", [
+    ("app.js", "replace_line", "let b = 2;", "one\n    let b = 2;\nthree\n"),
+    ("app.js", "insert_after_line", "inserted", "one\n    two\ninserted\nthree\n"),
+    ("app.js", "annotate", "check this", "one\n    two\n// SEO NOTE: check this\nthree\n"),
+    ("page.html", "replace_line", "<p>new</p>", "one\n<p>new</p>\nthree\n"),
+    ("page.html", "annotate", "check this", "one\n    two\n<!-- SEO NOTE: check this -->\nthree\n"),
+])
+def test_apply_patch_edits_the_requested_line(engine, tmp_path, name, action, code, expected):
+    path = _write(tmp_path, name, b"one\n    two\nthree\n")
+    
+    success, backup_path, error = engine.apply_patch(path, 2, action, code)
+    
+    assert (success, error) == (True, None)
+    assert (tmp_path / name).read_text() == expected
+    with open(backup_path, "rb") as backup:
+        assert backup.read() == b"one\n    two\nthree\n"
+
+
+def test_insert_after_line_zero_prepends(engine, tmp_path):
+    path = _write(tmp_path, "app.js", b"one\n")
+    
+    assert engine.apply_patch(path, 0, "insert_after_line", "'use strict';")[0]
+    assert (tmp_path / "app.js").read_text() == "'use strict';\none\n"
+
+
+@pytest.mark.parametrize("line_number", [0, 4])
+def test_apply_patch_rejects_out_of_range_line(engine, tmp_path, line_number):
+    path = _write(tmp_path, "app.js", b"one\ntwo\nthree\n")
+    
+    success, backup_path, error = engine.apply_patch(path, line_number, "replace_line", "x")
+    
+    assert not success
+    assert backup_path is None
+    assert "out of range" in error
+    assert (tmp_path / "app.js").read_bytes() == b"one\ntwo\nthree\n"
+
+
+def test_rollback_restores_backup(engine, tmp_path):
+    path = _write(tmp_path, "app.js", b"one\ntwo\n")
+    success, backup_path, _ = engine.apply_patch(path, 1, "replace_line", "changed")
+    assert success
+    
+    assert engine.rollback(path, backup_path)
+    assert (tmp_path / "app.js").read_bytes() == b"one\ntwo\n"
+    # The backup stays intact for a later rollback
+    assert engine.rollback(path, backup_path)
+    assert (tmp_path / "app.js").read_bytes() == b"one\ntwo\n"
+
+
+def test_rollback_reports_missing_backup(engine, tmp_path):
+    path = _write(tmp_path, "app.js", b"one\n")
+    
+    assert not engine.rollback(path, str(tmp_path / "backups" / "missing.bak"))
@@ -0,0 +1,38 @@
+import pytest
+
+from app.routers import patches
+from app.services.patch_engine import PatchEngine
+from app.services.patch_sandbox import PatchSandbox
+
+
+@pytest.fixture
+def backup_dir(tmp_path, monkeypatch):
+    backup_dir = tmp_path / "backups"
+    monkeypatch.setattr(patches, "patch_engine", PatchEngine(backup_dir=str(backup_dir)))
+    monkeypatch.setattr(patches, "patch_sandbox", PatchSandbox(str(tmp_path / "sandbox")))
+    return backup_dir
+
+
+def test_approved_patch_leaves_one_backup(backup_dir, tmp_path):
+    path = tmp_path / "app.js"
+    path.write_text("one\ntwo\n")
+    
+    outcome = patches._apply_issue_patch(str(path), 1, "replace_line", "changed")
+    
+    assert outcome["status"] == "applied"
+    assert path.read_text() == "changed\ntwo\n"
+    assert [str(backup) for backup in backup_dir.iterdir()] == [outcome["backup_path"]]
+    assert outcome["original_content"] == "one\ntwo\n"
+    assert list((tmp_path / "sandbox").iterdir()) == []
+
+
+def test_failed_patch_keeps_original(backup_dir, tmp_path):
+    path = tmp_path / "app.js"
+    path.write_text("one\n")
+    
+    outcome = patches._apply_issue_patch(str(path), 5, "replace_line", "changed")
+    
+    assert outcome["status"] == "failed"
+    assert "out of range" in outcome["error"]
+    assert path.read_text() == "one\n"
+    assert len(list(backup_dir.iterdir())) == 1
@@ -0,0 +1,33 @@
+import pytest
+
+from app.schemas.seo_schemas import HTMLChunk
+from app.services.seo_analyzer import SEOAnalyzer
+
+
+class FakeGemini:
+    """Returns a canned answer and records evicted prompts"""
+    
+    def __init__(self, answer: str):
+        self.answer = answer
+        self.discarded = []
+    
+    async def generate_content(self, prompt: str) -> str:
+        return self.answer
+    
+    def discard_cached(self, prompt: str):
+        self.discarded.append(prompt)
+
+
+@pytest.mark.parametrize("answer, evicted", [
+    ('{"issues": [], "keyword_scores": {}}', False),
+    ('no json here', True),
+    ('{"issues": [{"type": "not_a_type"}], "keyword_scores": {}}', True),
+])
+async def test_only_invalid_answers_are_evicted_from_cache(answer, evicted):
+    gemini = FakeGemini(answer)
+    analyzer = SEOAnalyzer(gemini)
+    
+    result = await analyzer._analyze_chunk(HTMLChunk(0, "<p>clean</p>", 0, 12), "https://example.com", ["seo"])
+    
+    assert result.issues == []
+    assert bool(gemini.discarded) is evicted
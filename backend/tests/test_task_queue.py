@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+
+from app.services.task_queue import TaskQueue, QueueFullError
+
+
+async def test_enqueue_beyond_maxsize_raises():
+    queue = TaskQueue("test", maxsize=1)
+    # No workers: jobs stay queued
+    await queue.start(worker_count=0)
+    
+    async def job():
+        pass
+    
+    queue.enqueue(job)
+    assert queue.is_full()
+    with pytest.raises(QueueFullError):
+        queue.enqueue(job)
+    
+    await queue.stop()
+
+
+async def test_stop_returns_running_and_queued_jobs():
+    queue = TaskQueue("test")
+    await queue.start(worker_count=1)
+    started = asyncio.Event()
+    
+    async def slow_job(name):
+        started.set()
+        await asyncio.sleep(60)
+    
+    queue.enqueue(slow_job, name="running")
+    queue.enqueue(slow_job, name="queued")
+    await started.wait()
+    
+    abandoned = await queue.stop()
+    
+    assert [kwargs["name"] for _, _, kwargs in abandoned] == ["running", "queued"]